@@ -0,0 +1,4 @@
+# benchmarks for FURNACE
+# bench_symbols.py runs with any Python
+# check_blendfile.py checks the reader of .blend files with any Python
+# bench_pipeline.py runs synthetic levels through Blender in the background
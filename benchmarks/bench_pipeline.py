@@ -0,0 +1,225 @@
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+
+
+# measure FURNACE on synthetic levels with Blender running in the background
+# each stage runs in a Blender process of its own so that peak memory is its own
+
+#   python benchmarks/bench_pipeline.py --blender /path/to/blender --preset small --output results.json
+
+# results from different commits can be compared afterwards
+
+#   python benchmarks/bench_pipeline.py --compare old.json new.json
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+RUNNER = os.path.join(HERE, "blender_run.py")
+
+STAGES = ( "plan", "prune", "separate", "face properties", "object properties", "full" )
+
+
+def commit():
+
+    try:
+        return subprocess.run(
+            [ "git", "rev-parse", "HEAD" ],
+            cwd=HERE,
+            stdout=subprocess.PIPE,
+            stderr=subprocess.DEVNULL,
+            text=True
+        ).stdout.strip()
+    except OSError:
+        return ""
+
+
+def run(blender, preset, stage, settings):
+
+    # one Blender process for one stage of one level
+
+    with tempfile.TemporaryDirectory() as directory:
+
+        path = os.path.join(directory, "result.json")
+
+        command = [ blender, "-b", "--python", RUNNER, "--", "--preset", preset, "--stage", stage, "--result", path ]
+
+        for name, value in settings.items():
+            command.extend([ "--" + name, str(value) ])
+
+        process = subprocess.run(command, stdout=subprocess.PIPE, stderr=subprocess.STDOUT, text=True)
+
+        try:
+            with open(path) as f:
+                result = json.load(f)
+        except (OSError, ValueError):
+            result = { "stage": stage, "status": "crashed", "errors": [ process.stdout[-4000:] ] }
+
+    result["preset"] = preset
+
+    return result
+
+
+def benchmark(blender, presets, stages, repeat, settings):
+
+    results = []
+
+    for preset in presets:
+        for stage in stages:
+            for i in range(repeat):
+
+                result = run(blender, preset, stage, settings)
+                results.append(result)
+
+                if result["status"] == "finished":
+                    print("%s %s: %.3f s" % (preset, stage, result["time"]))
+                else:
+                    print("%s %s: %s" % (preset, stage, result["status"]))
+
+    return {
+        "commit": commit(),
+        "created": time.strftime("%Y-%m-%d %H:%M:%S"),
+        "results": results
+    }
+
+
+def summarize(document):
+
+    # the median time and the highest peak memory of each stage of each level
+
+    times = {}
+    peaks = {}
+
+    for result in document["results"]:
+
+        if result["status"] != "finished": continue
+
+        key = (result["preset"], result["stage"])
+
+        times.setdefault(key, []).append(result["time"])
+        peaks[key] = max(peaks.get(key) or 0, result.get("peak_after") or 0)
+
+    return { key: (statistics.median(values), peaks[key]) for key, values in times.items() }
+
+
+def goldens(document):
+
+    # the fingerprint of the result of each level
+
+    return {
+        result["preset"]: result["golden"]
+        for result in document["results"] if result["status"] == "finished" and result["stage"] == "full"
+    }
+
+
+def compare(old, new):
+
+    before = summarize(old)
+    after = summarize(new)
+
+    print("%-10s %-18s %10s %10s %8s %10s" % ("level", "stage", "before", "after", "ratio", "peak MB"))
+
+    for key in sorted(set(before) & set(after)):
+
+        (t0, p0), (t1, p1) = before[key], after[key]
+
+        print("%-10s %-18s %10.3f %10.3f %7.2fx %10.1f" % (key[0], key[1], t0, t1, t0 / t1 if t1 else 0, p1 / 2 ** 20))
+
+    return check(goldens(old), goldens(new))
+
+
+def check(expected, actual):
+
+    # faster code should never change what the level ends up like
+
+    failed = 0
+
+    for preset in sorted(set(expected) & set(actual)):
+
+        if expected[preset]["digest"] == actual[preset]["digest"]: continue
+
+        failed += 1
+
+        print("%s: the result is different" % preset)
+
+        for name in differences(expected[preset], actual[preset])[:20]:
+            print("    %s" % name)
+
+    return failed
+
+
+def differences(expected, actual):
+
+    found = []
+
+    for kind in ("objects", "materials"):
+        for name in sorted(set(expected[kind]) | set(actual[kind])):
+            if expected[kind].get(name) != actual[kind].get(name): found.append("%s %s" % (kind[:-1], name))
+
+    return found
+
+
+def arguments(argv=None):
+
+    parser = argparse.ArgumentParser(
+        prog="python benchmarks/bench_pipeline.py",
+        description="Measure FURNACE on synthetic levels"
+    )
+
+    parser.add_argument("-b", "--blender", default=os.environ.get("BLENDER", "blender"), help="Blender executable")
+    parser.add_argument("-p", "--preset", action="append", choices=("small", "medium", "large"), help="sizes of level to measure")
+    parser.add_argument("-s", "--stage", action="append", choices=STAGES, help="stages to measure")
+    parser.add_argument("-r", "--repeat", type=int, default=3, help="number of times to measure each stage")
+    parser.add_argument("-o", "--output", default="results.json", help="file for the results")
+    parser.add_argument("--golden", help="results to check the fingerprints against")
+    parser.add_argument("--compare", nargs=2, metavar=("OLD", "NEW"), help="compare two results files instead")
+
+    # the presets can be adjusted
+
+    parser.add_argument("--objects", type=int)
+    parser.add_argument("--materials", type=int)
+    parser.add_argument("--faces", type=int)
+    parser.add_argument("--instances", type=float)
+    parser.add_argument("--seed", type=int)
+
+    return parser.parse_args(argv)
+
+
+def main(argv=None):
+
+    args = arguments(argv)
+
+    if args.compare:
+
+        documents = []
+
+        for path in args.compare:
+            with open(path) as f:
+                documents.append(json.load(f))
+
+        return 1 if compare(*documents) else 0
+
+    settings = {
+        name: getattr(args, name)
+        for name in ("objects", "materials", "faces", "instances", "seed") if getattr(args, name) is not None
+    }
+
+    document = benchmark(args.blender, args.preset or [ "small" ], args.stage or STAGES, args.repeat, settings)
+
+    with open(args.output, "w") as f:
+        json.dump(document, f, indent=4)
+
+    if args.golden:
+
+        with open(args.golden) as f:
+            expected = goldens(json.load(f))
+
+        return 1 if check(expected, goldens(document)) else 0
+
+    return 0
+
+
+if __name__ == "__main__": sys.exit(main())
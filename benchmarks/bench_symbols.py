@@ -0,0 +1,128 @@
+import importlib.util
+import os
+import random
+import sys
+import time
+
+
+# the symbol parser does not need Blender
+# load it straight from its file so that bpy is never imported
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+PATH = os.path.join(HERE, "..", "project_furnace", "symbols.py")
+
+spec = importlib.util.spec_from_file_location("symbols", PATH)
+symbols = importlib.util.module_from_spec(spec)
+spec.loader.exec_module(symbols)
+
+
+class Flags:
+
+    # stands in for the property group of a material
+
+    pass
+
+
+def legacy_parse(name, material):
+
+    # the character by character parser this replaces
+
+    table = dict(symbols.MATERIAL_SYMBOLS)
+
+    for c in name:
+
+        if c.isalnum(): return
+
+        if c in table: setattr(material, table[c], True)
+
+
+def legacy(names):
+
+    for name in names:
+
+        material = Flags()
+
+        for n in [ name, reversed(name) ]:
+            legacy_parse(n, material)
+
+
+def compiled(names):
+
+    for name in names:
+        symbols.material_flags(symbols.parse_material_name(name))
+
+
+def synthetic_names(count, unique, seed=0):
+
+    # names look like the ones found in levels imported from ASS files
+    # symbols before and after the name and a number added by Blender
+
+    rng = random.Random(seed)
+    chars = [ c for c, flag in symbols.MATERIAL_SYMBOLS ]
+
+    pool = []
+
+    for i in range(unique):
+
+        before = "".join(rng.sample(chars, rng.randint(0, 3)))
+        after = "".join(rng.sample(chars, rng.randint(0, 1)))
+        number = ".%03d" % rng.randint(1, 20) if rng.random() < 0.5 else ""
+
+        pool.append(before + "material_" + str(i) + after + number)
+
+    return [ rng.choice(pool) for i in range(count) ]
+
+
+def measure(function, names):
+
+    start = time.perf_counter()
+    function(names)
+
+    return time.perf_counter() - start
+
+
+def check(names):
+
+    # the compiled parser should enable the same flags as the old one
+
+    for name in set(names):
+
+        material = Flags()
+
+        for n in [ name, reversed(name) ]:
+            legacy_parse(n, material)
+
+        expected = sorted(vars(material))
+        actual = sorted(symbols.material_flags(symbols.parse_material_name(name)))
+
+        if expected != actual:
+            raise AssertionError(name + ": " + str(expected) + " != " + str(actual))
+
+
+def main(count=100000, unique=5000):
+
+    names = synthetic_names(count, unique)
+
+    check(names)
+
+    symbols.parse_material_name.cache_clear()
+    symbols.material_flags.cache_clear()
+
+    results = [
+        ("legacy", measure(legacy, names)),
+        ("compiled (cold)", measure(compiled, names)),
+        ("compiled (warm)", measure(compiled, names))
+    ]
+
+    print("%d names, %d unique" % (count, unique))
+
+    for label, seconds in results:
+        print("%-16s %8.2f ms" % (label, seconds * 1000))
+
+
+if __name__ == "__main__":
+
+    count = int(sys.argv[1]) if len(sys.argv) > 1 else 100000
+    unique = int(sys.argv[2]) if len(sys.argv) > 2 else 5000
+
+    main(count, unique)
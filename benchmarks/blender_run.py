@@ -0,0 +1,158 @@
+import json
+import os
+import sys
+import time
+import traceback
+
+import bpy
+
+
+# run FURNACE on a synthetic level inside Blender and measure it
+# this is started by bench_pipeline.py once for each level and stage
+
+#   blender -b --python blender_run.py -- --stage STAGE --result PATH [settings]
+
+# everything needed is imported through the repository
+# the add-ons Foundry and the Halo toolset still need to be enabled in Blender
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+
+sys.path.insert(0, os.path.dirname(HERE))
+
+from benchmarks import golden
+from benchmarks import synthetic
+
+from project_furnace import applier
+from project_furnace import face_layers
+from project_furnace import planner
+from project_furnace import profiling
+from project_furnace import scheduler
+
+
+STAGES = ( "plan", scheduler.PRUNE, scheduler.SEPARATE, scheduler.FACE_PROPERTIES, scheduler.OBJECT_PROPERTIES, "full" )
+
+
+def run_until(stage, scene):
+
+    # run everything before the given stage without measuring it
+    # then return a function that runs only the given stage
+
+    if stage == "plan": return lambda: planner.plan(scene)
+
+    if stage == "full": return lambda: applier.apply(planner.plan(scene))
+
+    work = applier.Applier(planner.plan(scene))
+    work.prepare_scene()
+
+    queue = work.queue
+
+    if stage == scheduler.PRUNE:
+        return lambda: work.remove_unused_slots(queue.drain(scheduler.PRUNE))
+
+    work.remove_unused_slots(queue.drain(scheduler.PRUNE))
+
+    def separate():
+        for obj in queue.run(scheduler.SEPARATE): work.separate(obj)
+
+    if stage == scheduler.SEPARATE: return separate
+
+    separate()
+    work.remove_unused_slots(queue.drain(scheduler.CLEAN_UP))
+
+    direct = face_layers.supported()
+
+    def set_face_properties():
+        for obj in queue.run(scheduler.FACE_PROPERTIES): work.set_face_properties(obj, direct)
+
+    if stage == scheduler.FACE_PROPERTIES: return set_face_properties
+
+    set_face_properties()
+
+    def set_object_properties():
+
+        for obj in queue.run(scheduler.OBJECT_PROPERTIES): work.set_object_properties(obj)
+
+        work.write_object_properties()
+
+    return set_object_properties
+
+
+def measure(settings, stage):
+
+    result = {
+        "settings": settings.dictionary(),
+        "stage": stage,
+        "status": "failed",
+        "blender": bpy.app.version_string,
+        "errors": []
+    }
+
+    try:
+
+        start = time.perf_counter()
+        scene = synthetic.generate(settings)
+        result["generate"] = time.perf_counter() - start
+
+        result["faces"] = sum(len(obj.data.polygons) for obj in scene.objects)
+
+        step = run_until(stage, scene)
+
+        result["peak_before"] = profiling.peak_memory()
+
+        start = time.perf_counter()
+        step()
+        result["time"] = time.perf_counter() - start
+
+        result["peak_after"] = profiling.peak_memory()
+
+        # the result of a full run is compared against a known good result
+
+        if stage == "full": result["golden"] = golden.fingerprint()
+
+        result["status"] = "finished"
+
+    except Exception:
+
+        result["errors"].append(traceback.format_exc())
+
+    return result
+
+
+def arguments(argv):
+
+    argv = argv[argv.index("--") + 1:] if "--" in argv else []
+
+    options = { "stage": "full", "result": None }
+    settings = synthetic.Settings()
+
+    while argv:
+
+        arg = argv.pop(0)
+
+        if arg == "--stage": options["stage"] = argv.pop(0)
+        elif arg == "--result": options["result"] = argv.pop(0)
+        elif arg == "--preset": settings.__dict__.update(synthetic.PRESETS[argv.pop(0)])
+        elif arg == "--instances": settings.instances = float(argv.pop(0))
+        elif arg.startswith("--"): setattr(settings, arg[2:], int(argv.pop(0)))
+
+    return options, settings
+
+
+def main(argv):
+
+    options, settings = arguments(argv)
+
+    if options["stage"] not in STAGES:
+        print("Unknown stage: %s" % options["stage"])
+        return 2
+
+    result = measure(settings, options["stage"])
+
+    if options["result"]:
+        with open(options["result"], "w") as f:
+            json.dump(result, f, indent=4)
+
+    return 0 if result["status"] == "finished" else 1
+
+
+if __name__ == "__main__": sys.exit(main(sys.argv))
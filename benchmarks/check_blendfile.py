@@ -0,0 +1,179 @@
+import os
+import struct
+import sys
+import tempfile
+
+
+# the reader of .blend files does not need Blender
+# check it against small files written here in both header layouts
+
+#   python benchmarks/check_blendfile.py
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+
+sys.path.insert(0, os.path.dirname(HERE))
+
+from project_furnace import blendfile
+from project_furnace import preflight
+
+
+# the structures the preflight reads with only the fields it needs
+# the name of the face count changed in Blender 4.0
+
+def structures(faces):
+    return [
+        ( "ID", [ ( "char", "name[66]" ) ] ),
+        ( "Object", [ ( "ID", "id" ), ( "short", "type" ), ( "void", "*data" ), ( "short", "totcol" ), ( "Material", "**mat" ) ] ),
+        ( "Mesh", [ ( "ID", "id" ), ( "int", "totvert" ), ( "int", faces ), ( "int", "totloop" ), ( "short", "totcol" ), ( "Material", "**mat" ) ] ),
+        ( "Material", [ ( "ID", "id" ) ] )
+    ]
+
+
+def pad(data):
+    return data + b"\0" * (-len(data) % 4)
+
+
+def size(field, lengths):
+
+    kind, name = field
+
+    if "*" in name: return 8
+
+    return lengths[kind] * (int(name.split("[")[1][:-1]) if "[" in name else 1)
+
+
+def dna(structs):
+
+    types = [ "char", "short", "int", "void" ] + [ kind for kind, fields in structs ]
+    names = sorted(set(name for kind, fields in structs for t, name in fields))
+
+    lengths = { "char": 1, "short": 2, "int": 4, "void": 0 }
+
+    for kind, fields in structs:
+        lengths[kind] = sum(size(f, lengths) for f in fields)
+
+    data = b"SDNA"
+    data += b"NAME" + struct.pack("<i", len(names)) + pad(b"".join(n.encode() + b"\0" for n in names))
+    data += b"TYPE" + struct.pack("<i", len(types)) + pad(b"".join(t.encode() + b"\0" for t in types))
+    data += b"TLEN" + pad(struct.pack("<%dh" % len(types), *[ lengths[t] for t in types ]))
+    data += b"STRC" + struct.pack("<i", len(structs))
+
+    for kind, fields in structs:
+
+        data += struct.pack("<hh", types.index(kind), len(fields))
+
+        for t, name in fields:
+            data += struct.pack("<hh", types.index(t), names.index(name))
+
+    return data
+
+
+def name(prefix, text):
+    return (prefix + text).encode().ljust(66, b"\0")
+
+
+def write(path, large, faces):
+
+    # two mesh objects and three materials
+    # the first object uses a portal and glass and the second a plain wall
+
+    structs = structures(faces)
+    index = { kind: i for i, (kind, fields) in enumerate(structs) }
+
+    if large:
+        header = b"BLENDER17-01v0500"
+        block = lambda code, sdna, address, data: struct.pack("<4siQqq", code, sdna, address, len(data), 1) + data
+    else:
+        header = b"BLENDER-v402"
+        block = lambda code, sdna, address, data: struct.pack("<4siQii", code, len(data), address, sdna, 1) + data
+
+    data = header
+
+    data += block(b"OB", index["Object"], 0x100, name("OB", "crate") + struct.pack("<hQhQ", 1, 0x200, 2, 0))
+    data += block(b"OB", index["Object"], 0x101, name("OB", "%level") + struct.pack("<hQhQ", 1, 0x201, 1, 0))
+
+    data += block(b"ME", index["Mesh"], 0x200, name("ME", "crate") + struct.pack("<iiihQ", 8, 6, 24, 2, 0x300))
+    data += block(b"DATA", 0, 0x300, struct.pack("<QQ", 0x400, 0x401))
+
+    data += block(b"ME", index["Mesh"], 0x201, name("ME", "level") + struct.pack("<iiihQ", 80, 60, 240, 1, 0x301))
+    data += block(b"DATA", 0, 0x301, struct.pack("<Q", 0x402))
+
+    data += block(b"MA", index["Material"], 0x400, name("MA", "+portal"))
+    data += block(b"MA", index["Material"], 0x401, name("MA", "glass%"))
+    data += block(b"MA", index["Material"], 0x402, name("MA", "wall"))
+
+    data += block(b"DNA1", 0, 0x900, dna(structs))
+    data += block(b"ENDB", 0, 0, b"")
+
+    with open(path, "wb") as f:
+        f.write(data)
+
+    return data
+
+
+def check(path, version):
+
+    summary = preflight.scan(path)
+
+    objects = { entry["name"]: entry for entry in summary["objects"] }
+
+    actual = {
+        "version": summary["version"],
+        "objects": sorted(objects),
+        "crate": (objects["crate"]["slots"], objects["crate"]["faces"], objects["crate"]["instance"]),
+        "level": (objects["%level"]["slots"], objects["%level"]["faces"], objects["%level"]["instance"]),
+        "portal": summary["materials"]["+portal"]["roles"],
+        "glass": summary["materials"]["glass%"]["roles"]
+    }
+
+    expected = {
+        "version": version,
+        "objects": [ "%level", "crate" ],
+        "crate": ([ "+portal", "glass%" ], 6, False),
+        "level": ([ "wall" ], 60, True),
+        "portal": [ preflight.PORTAL ],
+        "glass": [ preflight.TWO_SIDED ]
+    }
+
+    for key in expected:
+        if expected[key] != actual[key]:
+            raise AssertionError("%s %s: %r != %r" % (os.path.basename(path), key, actual[key], expected[key]))
+
+
+def check_damaged(path, data):
+
+    # a file cut short anywhere can only be unsupported
+    # any other error would stop the preflight of a whole batch
+
+    for end in range(12, len(data), 7):
+
+        with open(path, "wb") as f:
+            f.write(data[:end])
+
+        try: preflight.scan(path)
+        except blendfile.UnsupportedFile: pass
+
+        preflight.cost(path)
+
+
+def main():
+
+    layouts = [
+        ( "old.blend", False, "totpoly", 402 ),
+        ( "new.blend", True, "faces_num", 500 )
+    ]
+
+    with tempfile.TemporaryDirectory() as directory:
+
+        for filename, large, faces, version in layouts:
+
+            path = os.path.join(directory, filename)
+            data = write(path, large, faces)
+
+            check(path, version)
+            check_damaged(os.path.join(directory, "damaged_" + filename), data)
+
+            print("%s: ok" % filename)
+
+
+if __name__ == "__main__": main()
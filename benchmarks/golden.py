@@ -0,0 +1,104 @@
+import hashlib
+import json
+
+import bpy
+import numpy
+
+from project_furnace import face_layers
+from project_furnace import roles
+from project_furnace import symbols
+
+
+# describe the result of a run in a way that does not depend on how it was done
+# two runs give the same fingerprint only if they lead to the same level
+# faster ways of doing things should never change the fingerprint
+
+# the object properties FURNACE writes
+
+OBJECT_PROPERTIES = sorted({
+    "mesh_type_ui",
+    "portal_type_ui",
+    "portal_ai_deafening_ui",
+    "portal_blocks_sounds_ui",
+    "portal_is_door_ui",
+    "poop_lighting_ui",
+    "poop_pathfinding_ui"
+} | { p for c, (p, v) in symbols.OBJECT_SYMBOLS })
+
+# face layers get a random name every time they are added
+
+IGNORED = { "rna_type", "layer_name", "name" }
+
+
+def digest(data):
+
+    text = json.dumps(data, sort_keys=True, separators=(",", ":"))
+
+    return hashlib.sha256(text.encode()).hexdigest()
+
+
+def face_property(mesh, item):
+
+    values = {}
+
+    for p in item.bl_rna.properties:
+
+        if p.identifier in IGNORED: continue
+
+        values[p.identifier] = face_layers.plain(getattr(item, p.identifier))
+
+    # the faces the face property applies to
+
+    attribute = mesh.attributes.get(item.layer_name)
+
+    if attribute is not None:
+
+        mask = numpy.zeros(len(attribute.data), dtype=numpy.int32)
+        attribute.data.foreach_get("value", mask)
+
+        values["faces"] = hashlib.sha256(mask.tobytes()).hexdigest()
+
+    return values
+
+
+def describe_object(obj):
+
+    mesh = obj.data
+
+    indices = numpy.zeros(len(mesh.polygons), dtype=numpy.int32)
+    mesh.polygons.foreach_get("material_index", indices)
+
+    return {
+        "properties": { p: face_layers.plain(getattr(obj.nwo, p)) for p in OBJECT_PROPERTIES if hasattr(obj.nwo, p) },
+        "materials": [ slot.material.name if slot.material else "" for slot in obj.material_slots ],
+        "topology": [ len(mesh.vertices), len(mesh.edges), len(mesh.polygons) ],
+        "material_indices": hashlib.sha256(indices.tobytes()).hexdigest(),
+        "face_properties": [ face_property(mesh, item) for item in mesh.nwo.face_props ]
+    }
+
+
+def describe_material(material):
+    return sorted(f for f in roles.FLAGS if getattr(material.ass_jms, f))
+
+
+def fingerprint():
+
+    # a digest of every object and material in the level
+    # the digest of each object is kept too so that differences can be found
+
+    objects = {
+        obj.name: digest(describe_object(obj))
+        for obj in bpy.data.objects if obj.type == "MESH"
+    }
+
+    materials = {
+        m.name: digest(describe_material(m))
+        for m in bpy.data.materials if m.get("ass_jms")
+    }
+
+    return {
+        "digest": digest([ objects, materials ]),
+        "objects": objects,
+        "materials": materials
+    }
+
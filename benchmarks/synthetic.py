@@ -0,0 +1,199 @@
+import random
+
+import bpy
+import numpy
+
+
+# build levels that look like levels imported from Halo 3 ASS files
+# the same settings and seed always give the same level
+# this runs inside Blender with Foundry and the Halo toolset enabled
+
+# flags that are often enabled on materials in Halo 3 levels
+
+FLAGS = (
+    "two_sided",
+    "transparent_1_sided",
+    "render_only",
+    "collision_only",
+    "ladder",
+    "breakable",
+    "no_shadow",
+    "precise",
+    "decal_offset",
+    "slip_surface"
+)
+
+# symbols that can be found before and after material names
+
+SYMBOLS = "%#?!@*^-&=.;)<|~{}['0]"
+
+# sizes that are used often enough to have names
+
+PRESETS = {
+    "small": { "objects": 200, "materials": 50, "faces": 20000 },
+    "medium": { "objects": 2000, "materials": 300, "faces": 200000 },
+    "large": { "objects": 5000, "materials": 600, "faces": 1000000 }
+}
+
+
+class Settings:
+
+    def __init__(self, objects=200, materials=50, faces=20000, instances=0.2, seed=0):
+
+        self.objects = objects
+        self.materials = materials
+        self.faces = faces
+
+        # the share of objects that are instance geometry
+
+        self.instances = instances
+
+        self.seed = seed
+
+    def dictionary(self):
+        return dict(vars(self))
+
+
+def clear():
+
+    bpy.ops.wm.read_homefile(use_empty=True)
+
+    return bpy.data.scenes[0]
+
+
+def material_names(rng, count):
+
+    # every level has some materials with special uses
+    # the rest are regular materials with a few symbols here and there
+
+    names = [ "+portal", "+portal<", "+portal~", "+sky0", "+sky1", "+seamsealer", "glass_window%", "glass_pane?" ]
+
+    while len(names) < count:
+
+        name = "material_%d" % len(names)
+
+        if rng.random() < 0.3: name = rng.choice(SYMBOLS) + name
+        if rng.random() < 0.3: name = name + rng.choice(SYMBOLS)
+
+        names.append(name)
+
+    return names[:count]
+
+
+def new_material(rng, name):
+
+    material = bpy.data.materials.new(name)
+    flags = material.ass_jms
+
+    # touching the property group is what marks a material as a material for Halo
+
+    flags.two_sided = name.startswith("glass") and "%" in name
+    flags.transparent_2_sided = name.startswith("glass") and "?" in name
+
+    if name.startswith("+"): return material
+
+    for flag in rng.sample(FLAGS, rng.randint(0, 2)):
+        setattr(flags, flag, True)
+
+    # some materials have lightmap settings that need face properties of their own
+
+    if rng.random() < 0.1: flags.lightmap_res = rng.choice([ 0.5, 2.0 ])
+
+    if rng.random() < 0.05:
+        flags.power = rng.uniform(1.0, 100.0)
+        flags.color = (rng.random(), rng.random(), rng.random())
+
+    return material
+
+
+def quads(count, offset):
+
+    # separate quads laid out in a row
+    # every quad has vertices of its own like most imported geometry
+
+    corners = numpy.array([ (0, 0, 0), (1, 0, 0), (1, 1, 0), (0, 1, 0) ], dtype=numpy.float32)
+
+    positions = numpy.repeat(numpy.arange(count, dtype=numpy.float32), 4) * 1.5
+    vertices = numpy.tile(corners, (count, 1))
+
+    vertices[:, 0] += positions
+    vertices[:, 1] += offset
+
+    return vertices
+
+
+def new_mesh(name, count, offset):
+
+    mesh = bpy.data.meshes.new(name)
+
+    vertices = quads(count, offset)
+
+    mesh.vertices.add(len(vertices))
+    mesh.vertices.foreach_set("co", vertices.ravel())
+
+    mesh.loops.add(count * 4)
+    mesh.loops.foreach_set("vertex_index", numpy.arange(count * 4, dtype=numpy.int32))
+
+    mesh.polygons.add(count)
+    mesh.polygons.foreach_set("loop_start", numpy.arange(0, count * 4, 4, dtype=numpy.int32))
+
+    # the number of loops of each face is worked out from the starts in newer versions
+
+    if not mesh.polygons.bl_rna.properties["loop_total"].is_readonly:
+        mesh.polygons.foreach_set("loop_total", numpy.full(count, 4, dtype=numpy.int32))
+
+    mesh.update(calc_edges=True)
+    mesh.validate()
+
+    return mesh
+
+
+def assign_materials(rng, mesh, materials):
+
+    # most objects have a few materials
+    # some of them have one of the materials with a special use
+
+    count = rng.choice([ 1, 1, 2, 2, 3, 4 ])
+    chosen = rng.sample(materials, min(count, len(materials)))
+
+    for material in chosen:
+        mesh.materials.append(material)
+
+    faces = len(mesh.polygons)
+    indices = numpy.random.default_rng(rng.getrandbits(32)).integers(0, len(chosen), faces, dtype=numpy.int32)
+
+    mesh.polygons.foreach_set("material_index", indices)
+
+
+def generate(settings):
+
+    # build the level in an empty scene
+
+    rng = random.Random(settings.seed)
+    scene = clear()
+
+    materials = [ new_material(rng, name) for name in material_names(rng, settings.materials) ]
+
+    faces = max(settings.faces // max(settings.objects, 1), 1)
+
+    for i in range(settings.objects):
+
+        # instance geometry is named with the symbol % at the start
+        # sometimes with symbols for the object properties after it
+
+        if rng.random() < settings.instances:
+            name = "%" + rng.choice([ "", "!", "-", "*" ]) + "instance_%d" % i
+        else:
+            name = "structure_%d" % i
+
+        mesh = new_mesh(name, faces, i * 2.0)
+        assign_materials(rng, mesh, materials)
+
+        obj = bpy.data.objects.new(name, mesh)
+        scene.collection.objects.link(obj)
+
+        # touching the Foundry properties is what marks an object as ready for Foundry
+
+        obj.nwo.mesh_type_ui = "_connected_geometry_mesh_type_default"
+
+    return scene
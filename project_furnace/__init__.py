@@ -10,12 +10,15 @@ bl_info = {
 }
 
 
-from . import main
+# the add-on is only loaded inside Blender
+# other modules like the batch driver can be imported without bpy
 
 def register():
+    from . import main
     main.register()
 
 def unregister():
+    from . import main
     main.unregister()
 
 if __name__ == "__main__": register()
@@ -0,0 +1,456 @@
+import bpy
+
+from . import consolidation
+from . import face_layers
+from . import fingerprints
+from . import instance_geometry
+from . import materials
+from . import orphans
+from . import planner
+from . import profiling
+from . import properties
+from . import roles
+from . import scheduler
+from . import separation
+from . import slots
+
+
+# carry out a plan made by the planner
+# all the decisions were made while planning
+# this only writes the results to the scene with as few writes as possible
+
+
+def override(obj):
+
+    # run operators on the given object only
+    # without changing the selection or the active object
+
+    return bpy.context.temp_override(
+        object=obj,
+        active_object=obj,
+        edit_object=obj,
+        selected_objects=[ obj ],
+        selected_editable_objects=[ obj ]
+    )
+
+
+class Applier:
+
+    def __init__(self, plan, verify=False):
+
+        self.plan = plan
+
+        self.materials = plan["materials"]
+        self.layers = { name: entry["layers"] for name, entry in self.materials.items() }
+
+        # the plan for each object by its name
+        # objects separated from others use the plan of the original object
+
+        self.entries = { entry["name"]: entry for entry in plan["objects"] }
+        self.owners = {}
+
+        # replaced once the scene has been prepared
+
+        self.queue = scheduler.WorkQueue([])
+
+        # objects can share a mesh with other objects
+        # changes to a shared mesh are only made once
+
+        self.split = {}
+        self.layered = set()
+
+        # data left unused by the run is removed between stages
+
+        self.orphans = None
+
+        # the object properties of every object are written together at the end
+        # and read back afterwards if asked for
+
+        self.writer = properties.PropertyWriter()
+        self.verify = verify
+        self.mismatches = []
+
+        self.slots_removed = 0
+        self.slots_merged = 0
+
+        # objects that have not changed since the last run were left out of the plan
+
+        self.skipped = plan.get("skipped", 0)
+
+    def apart(self, material):
+
+        # materials that are not in the plan are not meant for Halo
+
+        if not material: return True
+
+        return self.materials.get(material.name, { "apart": True })["apart"]
+
+    def preparing(self):
+
+        # prepare the scene one piece at a time
+        # this yields after each material and object so that the work can be paused in between
+
+        # directly change the asset type to the correct type
+        # without actually interacting with the Foundry UI
+
+        bpy.data.scenes[self.plan["scene"]].nwo.asset_type = self.plan["asset_type"]
+
+        # anything unused before this point is left as it is
+
+        self.orphans = orphans.Collector()
+
+        # geometry is read directly from the meshes
+        # anything still in Edit Mode would not be up to date
+
+        if bpy.context.mode != "OBJECT":
+            bpy.ops.object.mode_set(mode="OBJECT")
+
+        # enable the flags of each material according to its name
+
+        for name, entry in self.materials.items():
+
+            if not entry["flags"]: continue
+
+            with profiling.phase("material flags"):
+                materials.set_material_flags(entry["flags"], bpy.data.materials[name].ass_jms)
+
+            yield
+
+        roles.build()
+
+        # take a snapshot of the objects in the plan
+        # objects separated from these are added to the queue as they are made
+
+        objects = []
+
+        for name, entry in self.entries.items():
+
+            obj = bpy.data.objects.get(name)
+
+            if obj is None: continue
+
+            self.owners[obj] = entry
+            objects.append(obj)
+
+        self.queue = scheduler.WorkQueue(objects)
+
+        # copies of the same geometry share one mesh from now on
+
+        for obj in objects:
+
+            with profiling.phase("link duplicates"):
+                self.link_duplicate(obj)
+
+            yield
+
+        # only copy the meshes that are going to change
+        # and are shared with objects that should not change along with them
+
+        for users in self.mesh_users(objects):
+
+            with profiling.phase("make single user"):
+                self.make_single_user(users)
+
+            yield
+
+        # objects converted before would otherwise end up with the same face properties twice
+
+        for obj in objects:
+
+            with profiling.phase("forget face properties"):
+                fingerprints.forget_layers(obj.data)
+
+            yield
+
+        # copies of the same material are replaced by one material
+        # and slots that end up with the same material become one slot
+
+        mapping = self.plan.get("merge", {})
+
+        if mapping:
+
+            for obj in objects:
+
+                if not self.owners[obj].get("merge"): continue
+
+                with profiling.phase("merge materials"):
+                    self.slots_merged += consolidation.merge(obj, mapping, bpy.data.materials.get)
+
+                yield
+
+            # the material slots of those objects have changed
+            # the copies are not used anywhere anymore and are removed with the other orphaned data
+
+            roles.forget()
+
+        self.collect()
+
+    def prepare_scene(self):
+        scheduler.complete(self.preparing())
+
+    def link_duplicate(self, obj):
+
+        entry = self.owners[obj]
+
+        # remember which objects are instance geometry for later runs
+
+        if entry.get("instance"): obj[instance_geometry.FLAG] = True
+
+        if not entry.get("duplicate_of"): return
+
+        original = bpy.data.objects.get(entry["duplicate_of"])
+
+        if original is None: return
+
+        # the geometry is the same relative to both objects
+        # so the object keeps its own placement
+
+        mesh = obj.data
+
+        obj.data = original.data
+
+        if mesh.users == 0: bpy.data.meshes.remove(mesh)
+
+    def collect(self):
+
+        with profiling.phase("collect orphans"):
+            self.orphans.collect()
+
+    def edits(self, obj):
+
+        # the mesh changes if slots are removed, if it is separated, if it gets face properties
+        # or if it still has face properties from an earlier run
+
+        return self.owners[obj].get("edits", True) or fingerprints.LAYERS in obj.data
+
+    def mesh_users(self, objects):
+
+        # objects that share a mesh need the same changes made to it
+        # as long as the materials belong to the mesh rather than the object
+        # those objects keep sharing the mesh and it is changed once for all of them
+
+        groups = {}
+
+        for obj in objects:
+
+            if not self.edits(obj): continue
+
+            shared = all(slot.link == "DATA" for slot in obj.material_slots)
+
+            groups.setdefault(obj.data if shared else obj, []).append(obj)
+
+        return list(groups.values())
+
+    def make_single_user(self, users):
+
+        # the mesh is copied only if something that should not change also uses it
+
+        mesh = users[0].data
+
+        if mesh.users - mesh.use_fake_user <= len(users): return
+
+        copy = mesh.copy()
+
+        for obj in users:
+            obj.data = copy
+
+    def remove_unused_slots(self, objects):
+
+        # remove the unused material slots of all the objects at once
+
+        self.slots_removed += slots.prune(set(obj.data for obj in objects))
+
+        # the material slots of many objects have changed by now
+        # look them up again the next time they are needed
+
+        roles.forget()
+
+    def separate(self, obj):
+
+        entry = self.owners[obj]
+
+        if not entry["split"]: return
+
+        # objects sharing a mesh with an object that was already separated
+        # get copies of its pieces that share the same meshes
+
+        mesh = obj.data
+
+        if mesh in self.split:
+            pieces = separation.link_pieces(obj, self.split[mesh])
+        else:
+            pieces = self.split[mesh] = separation.separate(obj, self.apart)
+
+        for piece in pieces:
+            self.owners[piece] = entry
+
+        self.queue.extend(pieces, scheduler.SEPARATE)
+
+    def set_face_properties(self, obj, direct):
+
+        # write face properties directly to the mesh if Foundry allows it
+        # otherwise enter Edit Mode to set up face properties with the operators
+        # return to Object Mode for the next step
+
+        # a shared mesh only gets face properties once
+
+        if obj.data in self.layered: return
+
+        self.layered.add(obj.data)
+
+        # remember which face properties were added
+        # so that they can be replaced instead of added again by a later run
+
+        count = len(obj.data.nwo.face_props)
+
+        if direct:
+
+            materials.set_face_properties(obj, self.layers)
+
+        else:
+
+            with override(obj):
+
+                bpy.ops.object.mode_set(mode="EDIT")
+
+                materials.set_face_properties_in_edit_mode(obj, self.layers)
+
+                bpy.ops.object.mode_set(mode="OBJECT")
+
+        names = [ item.layer_name for item in obj.data.nwo.face_props[count:] ]
+
+        if names: fingerprints.remember_layers(obj.data, names)
+
+    def object_properties(self, obj):
+
+        # find the planned object properties by the materials the object ended up with
+
+        names = sorted(slot.material.name if slot.material else "" for slot in obj.material_slots)
+
+        for piece in self.owners[obj]["pieces"]:
+            if piece["materials"] == names: return piece["properties"]
+
+        # the scene might have changed since the plan was made
+        # work out the object properties again in that case
+
+        print("WARNING: %s was not in the plan" % obj.name)
+
+        return planner.piece_properties(obj.name, roles.slots(obj), instance_geometry.is_instance(obj))
+
+    def set_object_properties(self, obj):
+
+        # directly set the object properties
+        # without interacting with the Foundry UI in the same way that users do
+
+        self.writer.add(obj, self.object_properties(obj))
+
+    def write_object_properties(self):
+
+        if not len(self.writer): return
+
+        self.writer.write()
+
+        if self.verify: self.mismatches.extend(self.writer.verify())
+
+        self.writer.clear()
+
+    def store_fingerprints(self):
+
+        # the next run compares these to know what has changed since
+
+        # only the objects that went through every stage and their materials are done
+
+        prints = { name: entry["fingerprint"] for name, entry in self.materials.items() }
+        used = set()
+
+        for obj in self.queue.done[scheduler.OBJECT_PROPERTIES]:
+
+            fingerprints.store(obj, fingerprints.object_fingerprint(obj, prints))
+
+            used.update(slot.material for slot in obj.material_slots if slot.material)
+
+        for material in used:
+            if material.name in prints: fingerprints.store(material, prints[material.name])
+
+    def steps(self):
+
+        # do the work one piece at a time
+        # the stage is given after each piece so that the work can be paused in between
+        # each piece is measured on its own so that time spent paused is not counted
+
+        yield from self.preparing()
+
+        # remove unused material slots before moving on
+
+        with profiling.phase(scheduler.PRUNE):
+            self.remove_unused_slots(self.queue.drain(scheduler.PRUNE))
+
+        yield scheduler.PRUNE
+
+        # separate any geometry intended to be glass or for setting up portals
+        # both are separated in the same pass over each object
+
+        for obj in self.queue.run(scheduler.SEPARATE):
+
+            with profiling.phase(scheduler.SEPARATE), profiling.per_object(obj):
+                self.separate(obj)
+
+            yield scheduler.SEPARATE
+
+        # remove unused material slots again
+        # this includes the objects that were separated from others
+
+        with profiling.phase(scheduler.CLEAN_UP):
+            self.remove_unused_slots(self.queue.drain(scheduler.CLEAN_UP))
+
+        self.collect()
+
+        yield scheduler.CLEAN_UP
+
+        # check once whether this version of Foundry allows
+        # face properties to be written directly to the meshes
+
+        direct = face_layers.supported()
+
+        for obj in self.queue.run(scheduler.FACE_PROPERTIES):
+
+            with profiling.phase(scheduler.FACE_PROPERTIES), profiling.per_object(obj):
+                self.set_face_properties(obj, direct)
+
+            yield scheduler.FACE_PROPERTIES
+
+        for obj in self.queue.run(scheduler.OBJECT_PROPERTIES):
+
+            with profiling.phase(scheduler.OBJECT_PROPERTIES), profiling.per_object(obj):
+                self.set_object_properties(obj)
+
+            yield scheduler.OBJECT_PROPERTIES
+
+        self.finish()
+
+    def finish(self):
+
+        # the object properties collected so far are written even if the run was stopped
+
+        with profiling.phase(scheduler.OBJECT_PROPERTIES):
+            self.write_object_properties()
+
+        # the objects that made it through every stage are remembered
+        # if the run was stopped early the rest are done again by the next run
+
+        with profiling.phase("fingerprints"):
+            self.store_fingerprints()
+
+        if self.orphans: self.collect()
+
+    def progress(self):
+        return self.queue.progress()
+
+    def apply(self):
+
+        for stage in self.steps(): pass
+
+        return self
+
+def apply(plan, verify=False):
+    return Applier(plan, verify).apply()
@@ -0,0 +1,378 @@
+import mmap
+import os
+import re
+
+from collections import namedtuple
+
+import numpy
+
+from . import symbols
+
+
+# read ASS files exported for Halo 3 and Halo 3: ODST without the Halo toolset
+# this does not need Blender so it can also be used outside of it
+
+# the file is read one line at a time through a memory map
+# sections are given one by one so only one object is in memory at a time
+
+#   for kind, value in ass.sections(path): ...
+
+# values are separated by whitespace and text is in double quotes
+# everything after a semicolon is a comment
+# the exporters write comments like ;MATERIAL 0 before each entry
+
+TOKENS = re.compile(rb'"([^"]*)"|([^\s"]+)')
+
+# comments that start a new section or a new entry of a section
+
+MARKS = ( b";###", b";MATERIAL", b";OBJECT", b";INSTANCE" )
+
+MARK = object()
+
+# the flags of a material are given as a string of 0 and 1
+# each position is the flag with the same position in the table of symbols
+
+FLAGS = tuple(flag for c, flag in symbols.MATERIAL_SYMBOLS)
+
+# the lightmap settings of a material are given as text starting with these
+# each value goes to the property of the Halo toolset with the same position
+
+SETTINGS = {
+    "BM_LMRES": (
+        ("lightmap_res", 1),
+        ("photon_fidelity", 1),
+        ("two_sided_transparent_tint", 3),
+        ("override_lightmap_transparency", 1),
+        ("additive_transparency", 3),
+        ("use_shader_gel", 1),
+        ("ignore_default_res_scale", 1)
+    ),
+    "BM_LIGHTING_BASIC": (
+        ("power", 1),
+        ("color", 3),
+        ("quality", 1),
+        ("power_per_unit_area", 1),
+        ("emissive_focus", 1)
+    ),
+    "BM_LIGHTING_ATTEN": (
+        ("attenuation_enabled", 1),
+        ("falloff_distance", 1),
+        ("cutoff_distance", 1)
+    ),
+    "BM_LIGHTING_FRUS": (
+        ("frustum_blend", 1),
+        ("frustum_falloff", 1),
+        ("frustum_cutoff", 1)
+    )
+}
+
+Header = namedtuple("Header", [ "version", "tool", "tool_version", "user", "machine" ])
+
+Material = namedtuple("Material", [ "index", "name", "effect", "flags", "settings" ])
+
+# the geometry of one object
+# positions and normals have a row for each vertex
+# uvs has the first texture coordinates of each vertex
+# triangles has a row of three vertices for each triangle
+# materials has the material of each triangle
+
+Mesh = namedtuple("Mesh", [ "index", "name", "positions", "normals", "uvs", "triangles", "materials" ])
+
+# objects that are not meshes are kept only so that the instances can refer to them
+
+Other = namedtuple("Other", [ "index", "kind", "name" ])
+
+# rotation is a quaternion given as i j k w
+
+Transform = namedtuple("Transform", [ "rotation", "translation", "scale" ])
+
+Instance = namedtuple("Instance", [ "index", "object", "unique_id", "name", "parent", "flags", "local", "pivot" ])
+
+
+class Reader:
+
+    # give the values of the file one by one
+
+    def __init__(self, buffer):
+
+        self.buffer = buffer
+        self.pending = []
+
+    def fill(self):
+
+        # read lines until there is something to give
+        # the comments that start entries are given as marks
+
+        while not self.pending:
+
+            line = self.buffer.readline()
+
+            if not line: return False
+
+            stripped = line.lstrip()
+
+            if stripped.startswith(b";"):
+
+                if stripped.startswith(MARKS): self.pending.append(MARK)
+                continue
+
+            line = line.split(b";", 1)[0] if b";" in line and b'"' not in line else line
+
+            for text, value in TOKENS.findall(line):
+                self.pending.append(("s", text) if value == b"" else ("v", value))
+
+            self.pending.reverse()
+
+        return True
+
+    def peek(self):
+
+        # the next value without taking it
+        # marks are given too so that entries can be told apart
+
+        if not self.fill(): return None
+
+        return self.pending[-1]
+
+    def take(self):
+
+        while True:
+
+            if not self.fill(): raise EOFError("The file ended too soon")
+
+            token = self.pending.pop()
+
+            if token is not MARK: return token
+
+    def string(self):
+
+        kind, value = self.take()
+
+        return value.decode("utf-8", "replace")
+
+    def int(self):
+        return int(self.take()[1])
+
+    def float(self):
+        return float(self.take()[1])
+
+    def floats(self, count):
+        return [ self.float() for i in range(count) ]
+
+    def line(self):
+
+        # the values left on the current line
+        # or the values of the next line if nothing is left on this one
+
+        if not self.fill(): raise EOFError("The file ended too soon")
+
+        values = [ token[1] for token in reversed(self.pending) if token is not MARK ]
+        self.pending = []
+
+        return values
+
+    def is_string(self):
+
+        token = self.peek()
+
+        return token is not None and token is not MARK and token[0] == "s"
+
+
+def read_header(reader):
+
+    return Header(
+        version=reader.int(),
+        tool=reader.string(),
+        tool_version=reader.string(),
+        user=reader.string(),
+        machine=reader.string()
+    )
+
+
+def material_settings(text):
+
+    # BM_FLAGS 0101... or BM_LMRES 1.0 1.0 ...
+
+    parts = text.split()
+    keyword, values = parts[0], parts[1:]
+
+    if keyword == "BM_FLAGS":
+
+        bits = "".join(values)
+
+        return { flag: True for flag, bit in zip(FLAGS, bits) if bit == "1" }
+
+    settings = {}
+
+    for name, count in SETTINGS.get(keyword, ()):
+
+        if len(values) < count: break
+
+        value = [ float(v) for v in values[:count] ]
+        values = values[count:]
+
+        settings[name] = value[0] if count == 1 else tuple(value)
+
+    return settings
+
+
+def read_material(reader, index):
+
+    # the name comes first and then the effect
+    # any settings follow as text starting with BM_
+
+    name = reader.string()
+    effect = ""
+
+    flags = {}
+    settings = {}
+
+    first = True
+
+    while reader.is_string():
+
+        text = reader.peek()[1].decode("utf-8", "replace")
+
+        if text.startswith("BM_"):
+
+            reader.take()
+
+            values = material_settings(text)
+
+            if text.startswith("BM_FLAGS"): flags.update(values)
+            else: settings.update(values)
+
+        elif first:
+
+            effect = reader.string()
+
+        else: break
+
+        first = False
+
+    return Material(index, name, effect, flags, settings)
+
+
+def read_mesh(reader, index, name):
+
+    # every vertex has a position and a normal
+    # followed by the nodes that influence it and its texture coordinates
+
+    count = reader.int()
+
+    positions = numpy.zeros((count, 3), dtype=numpy.float32)
+    normals = numpy.zeros((count, 3), dtype=numpy.float32)
+    uvs = numpy.zeros((count, 2), dtype=numpy.float32)
+
+    for i in range(count):
+
+        positions[i] = reader.floats(3)
+        normals[i] = reader.floats(3)
+
+        # node influences are not needed for levels
+
+        for n in range(reader.int()):
+            reader.int()
+            reader.float()
+
+        # only the first texture coordinates are kept
+        # each one is on a line of its own with two or three values
+
+        for t in range(reader.int()):
+
+            uvw = reader.line()
+
+            if t == 0: uvs[i] = [ float(v) for v in uvw[:2] ]
+
+    count = reader.int()
+
+    triangles = numpy.zeros((count, 3), dtype=numpy.int32)
+    materials = numpy.zeros(count, dtype=numpy.int32)
+
+    for i in range(count):
+
+        materials[i] = reader.int()
+        triangles[i] = [ reader.int(), reader.int(), reader.int() ]
+
+    return Mesh(index, name, positions, normals, uvs, triangles, materials)
+
+
+def skip_object(reader):
+
+    # the values of other kinds of objects are not needed
+    # skip ahead to the next object or to the next section
+
+    while True:
+
+        token = reader.peek()
+
+        if token is None or token is MARK: return
+
+        reader.take()
+
+
+def read_object(reader, index):
+
+    kind = reader.string()
+
+    # the path and name of the file the object comes from
+    # these are usually empty
+
+    reader.string()
+    name = reader.string()
+
+    if kind == "MESH": return read_mesh(reader, index, name)
+
+    skip_object(reader)
+
+    return Other(index, kind, name)
+
+
+def read_transform(reader):
+    return Transform(tuple(reader.floats(4)), tuple(reader.floats(3)), reader.float())
+
+
+def read_instance(reader, index):
+
+    return Instance(
+        index=index,
+        object=reader.int(),
+        unique_id=reader.int(),
+        name=reader.string(),
+        parent=reader.int(),
+        flags=reader.int(),
+        local=read_transform(reader),
+        pivot=read_transform(reader)
+    )
+
+
+def read(reader):
+
+    # the sections are always in the same order
+    # each section starts with the number of entries in it
+
+    yield "header", read_header(reader)
+
+    for i in range(reader.int()):
+        yield "material", read_material(reader, i)
+
+    for i in range(reader.int()):
+        yield "object", read_object(reader, i)
+
+    for i in range(reader.int()):
+        yield "instance", read_instance(reader, i)
+
+
+def sections(path):
+
+    # give the entries of the file one at a time
+    # the kind of each entry is given along with it
+
+    with open(path, "rb") as f:
+
+        # an empty file cannot be mapped
+
+        if os.fstat(f.fileno()).st_size == 0: raise EOFError("The file is empty")
+
+        with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as buffer:
+            yield from read(Reader(buffer))
@@ -0,0 +1,245 @@
+import os
+
+import bpy
+import numpy
+
+from mathutils import Matrix, Quaternion
+
+from . import ass
+from . import roles
+from . import symbols
+
+
+# build a level in Blender straight from an ASS file
+# the geometry is split by role as it is read
+# so FURNACE does not need to separate anything afterwards
+
+# geometry with a material for portals, glass, the sky or seam sealers
+# ends up in an object of its own for each material
+# the same names are used as for the roles of materials already in Blender
+
+STRUCTURE = roles.HALO
+
+
+def material_role(material):
+
+    # the flags include those enabled by the special symbols in the name
+
+    name = material.name
+    flags = set(material.flags) | set(symbols.material_flags(symbols.parse_material_name(name)))
+
+    # a material with more than one role goes with the first of them
+
+    found = symbols.material_roles(name, flags)
+
+    return found[0] if found else STRUCTURE
+
+
+def new_material(material):
+
+    result = bpy.data.materials.new(material.name)
+    flags = result.ass_jms
+
+    # every flag is written so that the material is recognized as a material for Halo
+
+    for flag in ass.FLAGS:
+        setattr(flags, flag, material.flags.get(flag, False))
+
+    for p, v in material.settings.items():
+
+        if not hasattr(flags, p): continue
+
+        if isinstance(getattr(flags, p), bool): v = bool(v)
+
+        setattr(flags, p, v)
+
+    return result
+
+
+def new_mesh(name, source, faces, slots):
+
+    # a mesh with the given triangles of the source
+    # only the vertices those triangles use are kept
+
+    triangles = source.triangles[faces]
+
+    used, inverse = numpy.unique(triangles, return_inverse=True)
+    loops = inverse.reshape(-1).astype(numpy.int32)
+
+    mesh = bpy.data.meshes.new(name)
+
+    mesh.vertices.add(len(used))
+    mesh.vertices.foreach_set("co", source.positions[used].ravel())
+
+    mesh.loops.add(len(loops))
+    mesh.loops.foreach_set("vertex_index", loops)
+
+    mesh.polygons.add(len(triangles))
+    mesh.polygons.foreach_set("loop_start", numpy.arange(0, len(loops), 3, dtype=numpy.int32))
+
+    # the number of loops of each face is worked out from the starts in newer versions
+
+    if not mesh.polygons.bl_rna.properties["loop_total"].is_readonly:
+        mesh.polygons.foreach_set("loop_total", numpy.full(len(triangles), 3, dtype=numpy.int32))
+
+    # each triangle uses the slot of its material
+
+    materials = source.materials[faces]
+    remap = { index: i for i, index in enumerate(slots) }
+
+    mesh.polygons.foreach_set("material_index", numpy.array([ remap[m] for m in materials.tolist() ], dtype=numpy.int32))
+
+    # texture coordinates are given for each vertex but Blender keeps them for each loop
+
+    uv = mesh.uv_layers.new(name="UVMap")
+    uv.data.foreach_set("uv", source.uvs[used][loops].ravel())
+
+    mesh.update(calc_edges=True)
+    mesh.validate()
+
+    # the normals of the file are kept for the shading it was made with
+    # validating never removes vertices so they still line up with the kept vertices
+    # custom normals are ignored unless auto smooth is on before Blender 4.1
+
+    if hasattr(mesh, "use_auto_smooth"): mesh.use_auto_smooth = True
+
+    mesh.normals_split_custom_set_from_vertices(source.normals[used].tolist())
+
+    return mesh
+
+
+def split_by_role(source, material_roles):
+
+    # structure stays together
+    # everything else ends up in a mesh of its own for each material
+
+    # faces with a material that does not exist use no material
+
+    materials = numpy.where(source.materials < len(material_roles), source.materials, -1)
+
+    apart = numpy.array([ role != STRUCTURE for role in material_roles ] + [ False ], dtype=bool)
+    groups = numpy.where(apart[materials], materials, -1)
+
+    pieces = []
+
+    for key in numpy.unique(groups).tolist():
+
+        faces = numpy.flatnonzero(groups == key)
+        slots = list(dict.fromkeys(source.materials[faces].tolist()))
+
+        pieces.append((STRUCTURE if key < 0 else material_roles[key], faces, slots))
+
+    return pieces
+
+
+def local_matrix(transform):
+
+    i, j, k, w = transform.rotation
+
+    rotation = Quaternion((w, i, j, k)).to_matrix().to_4x4()
+    scale = Matrix.Scale(transform.scale, 4)
+
+    return Matrix.Translation(transform.translation) @ rotation @ scale
+
+
+class Importer:
+
+    def __init__(self, collection, scale=1.0):
+
+        self.collection = collection
+        self.scale = Matrix.Scale(scale, 4)
+
+        self.materials = []
+        self.material_roles = []
+
+        # the meshes made from each object in the file
+
+        self.meshes = {}
+
+        # the placement of each instance in the level
+
+        self.matrices = {}
+        self.ids = {}
+
+        self.objects = []
+
+    def add_material(self, material):
+
+        self.materials.append(new_material(material))
+        self.material_roles.append(material_role(material))
+
+    def add_mesh(self, source):
+
+        # the meshes are made right away so only one object from the file is kept at a time
+
+        name = source.name or "object_%d" % source.index
+
+        meshes = []
+
+        for role, faces, slots in split_by_role(source, self.material_roles):
+
+            mesh = new_mesh(name, source, faces, slots)
+
+            for index in slots:
+                mesh.materials.append(self.materials[index] if 0 <= index < len(self.materials) else None)
+
+            meshes.append(mesh)
+
+        self.meshes[source.index] = meshes
+
+    def add_instance(self, instance):
+
+        # the parent is given by its unique id
+
+        parent = self.ids.get(instance.parent)
+        matrix = local_matrix(instance.local)
+
+        if parent is not None: matrix = self.matrices[parent] @ matrix
+
+        self.matrices[instance.index] = matrix
+        self.ids[instance.unique_id] = instance.index
+
+        # each instance of the same object shares the same meshes
+
+        for mesh in self.meshes.get(instance.object, []):
+
+            obj = bpy.data.objects.new(instance.name, mesh)
+            obj.matrix_world = self.scale @ matrix
+
+            self.collection.objects.link(obj)
+            self.objects.append(obj)
+
+    def add(self, kind, value):
+
+        if kind == "material": self.add_material(value)
+        elif kind == "object" and isinstance(value, ass.Mesh): self.add_mesh(value)
+        elif kind == "instance": self.add_instance(value)
+
+    def finish(self):
+
+        # meshes of objects without any instances are not needed
+
+        for meshes in self.meshes.values():
+            for mesh in meshes:
+                if mesh.users == 0: bpy.data.meshes.remove(mesh)
+
+
+def load(path, scene=None, scale=1.0):
+
+    # read the file one entry at a time and build the level as it goes
+
+    if scene is None: scene = bpy.context.scene
+
+    name = os.path.splitext(os.path.basename(path))[0]
+
+    collection = bpy.data.collections.new(name)
+    scene.collection.children.link(collection)
+
+    importer = Importer(collection, scale)
+
+    for kind, value in ass.sections(path):
+        importer.add(kind, value)
+
+    importer.finish()
+
+    return importer.objects
@@ -0,0 +1,455 @@
+import argparse
+import json
+import os
+import queue
+import shutil
+import subprocess
+import sys
+import threading
+import time
+
+from concurrent.futures import ThreadPoolExecutor, as_completed
+
+from . import client
+from . import preflight
+
+
+# convert many levels at once with Blender running in the background
+# this runs outside Blender with a regular Python interpreter
+
+#   python -m project_furnace.batch LEVELS --output DIRECTORY --jobs 8
+
+# with --persistent each Blender process starts once and converts many files
+# with --shards each file is split into shards converted by several Blender processes at once
+
+WORKER = os.path.join(os.path.dirname(os.path.abspath(__file__)), "worker.py")
+
+
+def find_files(inputs):
+
+    # each input can be a .blend file or a directory with .blend files in it
+
+    files = []
+
+    for path in inputs:
+
+        if os.path.isdir(path):
+
+            for root, directories, names in os.walk(path):
+                files.extend(os.path.join(root, n) for n in sorted(names) if n.endswith(".blend"))
+
+        elif path.endswith(".blend"):
+            files.append(path)
+
+    return [ os.path.abspath(f) for f in files ]
+
+
+def name_clashes(files):
+
+    # the results of each file are named after the file alone
+    # files with the same name in different directories would overwrite each other's results
+
+    paths = {}
+
+    for f in files:
+        paths.setdefault(os.path.splitext(os.path.basename(f))[0], []).append(f)
+
+    return { name: found for name, found in paths.items() if len(found) > 1 }
+
+
+def balance(files):
+
+    # start the heaviest levels first so that no worker is left alone with a heavy level at the end
+    # levels that could not be scanned are started first since nothing is known about them
+
+    costs = { f: preflight.cost(f) for f in files }
+
+    return sorted(files, key=lambda f: (costs[f] is not None, -(costs[f] or 0)))
+
+
+def command(blender, source, output):
+    return [ blender, "-b", "--python", WORKER, "--", "--output", output, source ]
+
+
+def summary_path(source, output):
+
+    name = os.path.splitext(os.path.basename(source))[0]
+
+    return os.path.join(output, name + ".json")
+
+
+def run(blender, source, output, timeout=None):
+
+    # start a Blender worker for the file and wait for it to finish
+    # the worker writes a summary of its own unless it crashed
+
+    # a summary left over from an earlier run should not be mistaken for this one
+
+    path = summary_path(source, output)
+
+    if os.path.exists(path): os.remove(path)
+
+    start = time.perf_counter()
+
+    try:
+
+        process = subprocess.run(
+            command(blender, source, output),
+            stdout=subprocess.PIPE,
+            stderr=subprocess.STDOUT,
+            text=True,
+            timeout=timeout
+        )
+
+        returncode = process.returncode
+        log = process.stdout
+
+    except subprocess.TimeoutExpired as e:
+
+        returncode = None
+        log = e.stdout.decode(errors="replace") if isinstance(e.stdout, bytes) else (e.stdout or "")
+
+    elapsed = time.perf_counter() - start
+
+    # the summary is written by the worker
+    # if it is missing write one that says what went wrong
+
+    try:
+
+        with open(path) as f:
+            summary = json.load(f)
+
+    except (OSError, ValueError):
+
+        summary = {
+            "file": source,
+            "status": "crashed" if returncode is not None else "timed out",
+            "errors": [ log[-4000:] ]
+        }
+
+    summary["returncode"] = returncode
+    summary.setdefault("timings", {})["total"] = elapsed
+
+    with open(path, "w") as f:
+        json.dump(summary, f, indent=4)
+
+    with open(os.path.splitext(path)[0] + ".log", "w") as f:
+        f.write(log)
+
+    return summary
+
+
+def convert(files, output, blender="blender", jobs=None, timeout=None):
+
+    # one Blender process per file with as many running at once as there are jobs
+    # the threads only wait for the processes so the work is done by the processes
+
+    os.makedirs(output, exist_ok=True)
+
+    jobs = jobs or os.cpu_count() or 1
+    summaries = []
+
+    with ThreadPoolExecutor(max_workers=jobs) as pool:
+
+        futures = [ pool.submit(run, blender, f, output, timeout) for f in files ]
+
+        for i, future in enumerate(as_completed(futures)):
+
+            summary = future.result()
+            summaries.append(summary)
+
+            report(i + 1, len(files), summary)
+
+    with open(os.path.join(output, "summary.json"), "w") as f:
+        json.dump(summaries, f, indent=4)
+
+    return summaries
+
+
+def report(i, total, summary):
+
+    print("[%d/%d] %s: %s (%.1f s)" % (
+        i,
+        total,
+        os.path.basename(summary["file"]),
+        summary["status"],
+        summary["timings"]["total"]
+    ))
+
+
+def convert_persistent(files, output, blender="blender", jobs=None, timeout=None):
+
+    # start each worker once and keep sending it files until there are none left
+    # this saves starting Blender and registering add-ons for every file
+
+    os.makedirs(output, exist_ok=True)
+
+    jobs = min(jobs or os.cpu_count() or 1, len(files))
+    authkey = client.new_authkey()
+
+    pending = queue.Queue()
+
+    for f in files:
+        pending.put(f)
+
+    summaries = []
+    lock = threading.Lock()
+
+    def work(index):
+
+        log = os.path.join(output, "worker_%d.log" % index)
+
+        process = None
+        connection = None
+
+        def stop(kill=False):
+
+            # a worker that crashed or timed out is not asked to stop
+
+            if process is None: return
+
+            try:
+                if kill: raise OSError
+                connection.stop()
+            except (AttributeError, EOFError, OSError): process.kill()
+
+            process.wait()
+
+        try:
+
+            while True:
+
+                try: source = pending.get_nowait()
+                except queue.Empty: break
+
+                start = time.perf_counter()
+
+                try:
+
+                    # a new worker is started after the last one crashed or timed out
+
+                    if process is None:
+                        process, port = client.start_worker(blender, authkey, log)
+                        connection = client.Client(port, authkey)
+
+                    summary = connection.convert(source, output, timeout=timeout)
+
+                except TimeoutError as e:
+                    summary = { "file": source, "status": "timed out", "errors": [ str(e) ] }
+                except (EOFError, OSError, RuntimeError) as e:
+                    summary = { "file": source, "status": "crashed", "errors": [ str(e) ] }
+
+                summary.setdefault("timings", {})["total"] = time.perf_counter() - start
+
+                with lock:
+                    summaries.append(summary)
+                    report(len(summaries), len(files), summary)
+
+                if summary["status"] in ("crashed", "timed out"):
+                    stop(kill=True)
+                    process = connection = None
+
+        finally:
+            stop()
+
+    with ThreadPoolExecutor(max_workers=jobs) as pool:
+        for future in [ pool.submit(work, i) for i in range(jobs) ]:
+            future.result()
+
+    with open(os.path.join(output, "summary.json"), "w") as f:
+        json.dump(summaries, f, indent=4)
+
+    return summaries
+
+
+def run_step(blender, arguments, log, timeout=None):
+
+    # run one step of a sharded conversion in a Blender process of its own
+    # the output of the process is kept in the given log
+
+    try:
+
+        process = subprocess.run(
+            [ blender, "-b", "--python", WORKER, "--" ] + arguments,
+            stdout=subprocess.PIPE,
+            stderr=subprocess.STDOUT,
+            text=True,
+            timeout=timeout
+        )
+
+        returncode = process.returncode
+        text = process.stdout
+
+    except subprocess.TimeoutExpired as e:
+
+        returncode = None
+        text = e.stdout.decode(errors="replace") if isinstance(e.stdout, bytes) else (e.stdout or "")
+
+    with open(log, "w") as f:
+        f.write(text)
+
+    return returncode
+
+
+def convert_sharded(source, output, blender="blender", count=None, timeout=None):
+
+    # plan the level once, convert its shards at the same time and merge the results
+    # each step writes a file and a missing file means the step failed
+
+    name = os.path.splitext(os.path.basename(source))[0]
+    directory = os.path.join(output, name + ".shards")
+
+    # results left over from an earlier run should not be mistaken for this one
+
+    shutil.rmtree(directory, ignore_errors=True)
+    os.makedirs(directory)
+
+    count = count or os.cpu_count() or 1
+    manifest = os.path.join(directory, "manifest.json")
+
+    summary = {
+        "file": source,
+        "output": os.path.join(output, name + ".blend"),
+        "status": "failed",
+        "timings": {},
+        "shards": [],
+        "errors": []
+    }
+
+    timings = summary["timings"]
+
+    def step(label, arguments):
+
+        start = time.perf_counter()
+        returncode = run_step(blender, arguments, os.path.join(directory, label + ".log"), timeout)
+        timings[label] = time.perf_counter() - start
+
+        return returncode
+
+    start = time.perf_counter()
+
+    step("prepare", [ "--prepare-shards", str(count), "--output", directory, source ])
+
+    if not os.path.exists(manifest):
+        summary["errors"].append("the level could not be split into shards, see prepare.log")
+
+    else:
+
+        with open(manifest) as f:
+            shards = json.load(f)["shards"]
+
+        # nothing in the level needs to be converted
+        # for example when every object is unchanged since the last run
+
+        if not shards:
+            shutil.copyfile(source, summary["output"])
+            summary["status"] = "finished"
+
+        else:
+            with ThreadPoolExecutor(max_workers=len(shards)) as pool:
+                for i in range(len(shards)):
+                    pool.submit(step, "shard_%d" % i, [ "--shard", str(i), manifest ])
+
+        missing = [ i for i in range(len(shards)) if not os.path.exists(os.path.join(directory, "shard_%d.json" % i)) ]
+
+        for i in missing:
+            summary["errors"].append("shard %d failed, see shard_%d.log" % (i, i))
+
+        summary["shards"] = [ { "objects": len(s["objects"]), "faces": s["faces"] } for s in shards ]
+
+        if shards and not missing:
+
+            if os.path.exists(summary["output"]): os.remove(summary["output"])
+
+            step("merge", [ "--merge-shards", "--output", output, manifest ])
+
+            if os.path.exists(summary["output"]): summary["status"] = "finished"
+            else: summary["errors"].append("the shards could not be merged, see merge.log")
+
+    timings["total"] = time.perf_counter() - start
+
+    with open(summary_path(source, output), "w") as f:
+        json.dump(summary, f, indent=4)
+
+    return summary
+
+
+def arguments(argv=None):
+
+    parser = argparse.ArgumentParser(
+        prog="python -m project_furnace.batch",
+        description="Prepare many H3 levels for import to Reach with Blender in the background"
+    )
+
+    parser.add_argument("inputs", nargs="+", help=".blend files or directories with .blend files")
+    parser.add_argument("-o", "--output", required=True, help="directory for converted files and summaries")
+    parser.add_argument("-j", "--jobs", type=int, default=os.cpu_count(), help="number of Blender processes at once")
+    parser.add_argument("-b", "--blender", default=os.environ.get("BLENDER", "blender"), help="Blender executable")
+    parser.add_argument("-t", "--timeout", type=float, default=None, help="seconds before a file is given up on")
+    parser.add_argument("-p", "--persistent", action="store_true", help="start each Blender process once for many files")
+    parser.add_argument("-s", "--shards", type=int, default=None, help="split each file into this many shards converted at once")
+    parser.add_argument("--balance", action="store_true", help="scan the files first and start the heaviest ones first")
+    parser.add_argument("--lightmap-budget", type=float, default=None, help="millions of lightmap texels to fit each level into")
+    parser.add_argument("--profile", action="store_true", help="measure each phase and write a profile next to each summary")
+    parser.add_argument("--instances", action="store_true", help="let objects with the same mesh as another object share it as instance geometry")
+
+    return parser.parse_args(argv)
+
+
+def main(argv=None):
+
+    args = arguments(argv)
+    files = find_files(args.inputs)
+
+    if not files:
+        print("No .blend files found")
+        return 1
+
+    clashes = name_clashes(files)
+
+    if clashes:
+
+        for name, found in clashes.items():
+            print("%d files are named %s.blend, their results would overwrite each other: %s" % (len(found), name, ", ".join(found)), file=sys.stderr)
+
+        print("Convert files with the same name into different output directories", file=sys.stderr)
+
+        return 1
+
+    output = os.path.abspath(args.output)
+
+    if args.balance: files = balance(files)
+
+    # the workers inherit this and measure each file they convert
+
+    if args.profile: os.environ["FURNACE_PROFILE"] = "1"
+
+    if args.lightmap_budget: os.environ["FURNACE_LIGHTMAP_BUDGET"] = str(args.lightmap_budget)
+
+    if args.instances: os.environ["FURNACE_INSTANCES"] = "1"
+
+    if args.shards:
+
+        os.makedirs(output, exist_ok=True)
+
+        summaries = []
+
+        for i, source in enumerate(files):
+
+            summaries.append(convert_sharded(source, output, args.blender, args.shards, args.timeout))
+            report(i + 1, len(files), summaries[-1])
+
+        with open(os.path.join(output, "summary.json"), "w") as f:
+            json.dump(summaries, f, indent=4)
+
+    elif args.persistent: summaries = convert_persistent(files, output, args.blender, args.jobs, args.timeout)
+    else: summaries = convert(files, output, args.blender, args.jobs, args.timeout)
+
+    failed = [ s for s in summaries if s["status"] != "finished" ]
+
+    print("%d converted, %d failed" % (len(summaries) - len(failed), len(failed)))
+
+    return 1 if failed else 0
+
+
+if __name__ == "__main__": sys.exit(main())
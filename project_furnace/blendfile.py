@@ -0,0 +1,348 @@
+import gzip
+import os
+import re
+import struct
+
+from collections import namedtuple
+
+
+# read the blocks of a .blend file without opening it in Blender
+# this runs outside Blender with a regular Python interpreter
+
+# a .blend file is a header followed by blocks
+# each block has a code, the address its data had in memory when the file was saved,
+# the index of the structure it holds and the number of structures in it
+# the layout of every structure is described by the block DNA1 near the end of the file
+
+# files are read from start to end without going back
+# so compressed files can be read as they are decompressed
+
+GZIP = b"\x1f\x8b"
+ZSTD = b"\x28\xb5\x2f\xfd"
+
+# the sizes of the basic types found in the structures
+
+BASIC = {
+    "char": "b",
+    "uchar": "B",
+    "int8_t": "b",
+    "uint8_t": "B",
+    "short": "h",
+    "ushort": "H",
+    "int": "i",
+    "uint": "I",
+    "int32_t": "i",
+    "uint32_t": "I",
+    "float": "f",
+    "double": "d",
+    "int64_t": "q",
+    "uint64_t": "Q"
+}
+
+ARRAY = re.compile(r"\[(\d+)\]")
+
+Format = namedtuple("Format", [ "pointer", "endian", "large", "version" ])
+
+Block = namedtuple("Block", [ "code", "size", "address", "sdna", "count" ])
+
+Field = namedtuple("Field", [ "offset", "type", "pointer", "length" ])
+
+
+# a file that was cut short or written wrongly fails in many ways while being read
+# all of them are turned into UnsupportedFile so that callers only have one error to expect
+
+DAMAGED = (struct.error, ValueError, IndexError, EOFError)
+
+
+class UnsupportedFile(Exception):
+    pass
+
+
+def damaged(error):
+    return UnsupportedFile("the file is damaged or cut short (%s: %s)" % (type(error).__name__, error))
+
+
+def open_file(path):
+
+    # files saved with compression start with the magic number of gzip or zstd
+
+    with open(path, "rb") as f:
+        magic = f.read(4)
+
+    if magic[:2] == GZIP: return gzip.open(path, "rb")
+
+    if magic == ZSTD:
+
+        try: import zstandard
+        except ImportError: raise UnsupportedFile("%s is compressed with zstd which needs the zstandard module" % path)
+
+        return zstandard.ZstdDecompressor().stream_reader(open(path, "rb"), closefd=True)
+
+    return open(path, "rb")
+
+
+def read_format(f):
+
+    # BLENDER-v402 for files saved before Blender 5.0
+    # BLENDER17-01v0500 for files saved since then
+
+    try:
+
+        start = f.read(12)
+
+        if not start.startswith(b"BLENDER"): raise UnsupportedFile("not a .blend file")
+
+        if start[7:9].isdigit():
+
+            text = start + f.read(int(start[7:9]) - 12)
+
+            return Format(8, "<" if text[12:13] == b"v" else ">", True, int(text[13:17]))
+
+        return Format(
+            8 if start[7:8] == b"-" else 4,
+            "<" if start[8:9] == b"v" else ">",
+            False,
+            int(start[9:12])
+        )
+
+    except DAMAGED as e: raise damaged(e) from e
+
+
+def block_layout(fmt):
+
+    # blocks in newer files have room for larger sizes
+
+    if fmt.large: return struct.Struct(fmt.endian + "4siQqq"), ( 0, 3, 2, 1, 4 )
+
+    pointer = "Q" if fmt.pointer == 8 else "I"
+
+    return struct.Struct(fmt.endian + "4si" + pointer + "ii"), ( 0, 1, 2, 3, 4 )
+
+
+def skip(f, size):
+
+    # compressed files can only go forward by reading
+
+    try: f.seek(size, os.SEEK_CUR)
+    except (OSError, ValueError):
+
+        while size > 0:
+
+            chunk = f.read(min(size, 1 << 20))
+
+            if not chunk: break
+
+            size -= len(chunk)
+
+
+def blocks(f, fmt):
+
+    # give each block in turn along with a function that reads its data
+    # the data is skipped if it is not read before the next block
+
+    layout, order = block_layout(fmt)
+
+    while True:
+
+        try: header = f.read(layout.size)
+        except DAMAGED as e: raise damaged(e) from e
+
+        if len(header) < layout.size: return
+
+        values = layout.unpack(header)
+        block = Block(*[ values[i] for i in order ])
+
+        code = block.code.rstrip(b"\0")
+
+        if code == b"ENDB": return
+
+        read = []
+
+        def data(block=block):
+
+            read.append(True)
+
+            try: return f.read(block.size)
+            except DAMAGED as e: raise damaged(e) from e
+
+        yield code, block, data
+
+        if not read:
+            try: skip(f, block.size)
+            except DAMAGED as e: raise damaged(e) from e
+
+
+class DNA:
+
+    # the layout of every structure saved in the file
+
+    def __init__(self, data, fmt):
+
+        self.fmt = fmt
+
+        try: self.parse(data)
+        except DAMAGED as e: raise damaged(e) from e
+
+    def parse(self, data):
+
+        fmt = self.fmt
+
+        position = self.expect(data, 0, b"SDNA")
+
+        names, position = self.strings(data, position, b"NAME")
+        types, position = self.strings(data, position, b"TYPE")
+
+        # the size of each type
+
+        position = self.expect(data, position, b"TLEN")
+
+        lengths = struct.unpack_from(fmt.endian + "%dh" % len(types), data, position)
+        position = align(position + 2 * len(types))
+
+        position = self.expect(data, position, b"STRC")
+
+        count, = struct.unpack_from(fmt.endian + "i", data, position)
+        position += 4
+
+        self.types = types
+        self.lengths = dict(zip(types, lengths))
+        self.structs = []
+        self.layouts = {}
+
+        for i in range(count):
+
+            kind, fields = struct.unpack_from(fmt.endian + "hh", data, position)
+            position += 4
+
+            members = struct.unpack_from(fmt.endian + "%dh" % (2 * fields), data, position)
+            position += 4 * fields
+
+            self.structs.append(types[kind])
+            self.layouts[types[kind]] = self.layout([ (types[members[j]], names[members[j + 1]]) for j in range(0, len(members), 2) ])
+
+    def expect(self, data, position, code):
+
+        if data[position:position + 4] != code: raise UnsupportedFile("the DNA of the file could not be read")
+
+        return position + 4
+
+    def strings(self, data, position, code):
+
+        position = self.expect(data, position, code)
+
+        count, = struct.unpack_from(self.fmt.endian + "i", data, position)
+        position += 4
+
+        strings = []
+
+        for i in range(count):
+
+            end = data.index(b"\0", position)
+            strings.append(data[position:end].decode("utf-8", "replace"))
+            position = end + 1
+
+        return strings, align(position)
+
+    def layout(self, members):
+
+        # the offset of every field of a structure
+        # fields are found by their names without the * and the size of arrays
+
+        fields = {}
+        offset = 0
+
+        for kind, name in members:
+
+            pointer = "*" in name
+            length = 1
+
+            for n in ARRAY.findall(name):
+                length *= int(n)
+
+            key = re.sub(r"[\*\(\)]|\[.*$", "", name)
+
+            size = self.fmt.pointer if pointer else self.lengths.get(kind, 0)
+
+            fields[key] = Field(offset, kind, pointer, length)
+            offset += size * length
+
+        return fields
+
+    def field(self, kind, path):
+
+        # the fields of nested structures are found by joining the names with dots
+
+        offset = 0
+
+        for name in path.split("."):
+
+            field = self.layouts.get(kind, {}).get(name)
+
+            if field is None: return None
+
+            offset += field.offset
+            kind = field.type
+
+        return field._replace(offset=offset)
+
+    def read(self, data, kind, path, default=None):
+
+        # a single value or the text of an array of characters
+
+        field = self.field(kind, path)
+
+        if field is None: return default
+
+        try: return self.value(data, field, default)
+        except DAMAGED as e: raise damaged(e) from e
+
+    def value(self, data, field, default=None):
+
+        if field.pointer: return struct.unpack_from(self.fmt.endian + ("Q" if self.fmt.pointer == 8 else "I"), data, field.offset)[0]
+
+        if field.type == "char" and field.length > 1:
+            text = data[field.offset:field.offset + field.length]
+            return text.split(b"\0", 1)[0].decode("utf-8", "replace")
+
+        code = BASIC.get(field.type)
+
+        if code is None: return default
+
+        return struct.unpack_from(self.fmt.endian + code, data, field.offset)[0]
+
+    def first(self, data, kind, paths, default=None):
+
+        # fields are sometimes renamed between versions of Blender
+
+        for path in paths:
+
+            value = self.read(data, kind, path)
+
+            if value is not None: return value
+
+        return default
+
+    def pointers(self, data):
+
+        code = "Q" if self.fmt.pointer == 8 else "I"
+        count = len(data) // self.fmt.pointer
+
+        return struct.unpack_from(self.fmt.endian + code * count, data)
+
+
+def align(position):
+    return (position + 3) & ~3
+
+
+def read_dna(path):
+
+    # the DNA is one of the last blocks so the whole file is gone through once to find it
+
+    with open_file(path) as f:
+
+        fmt = read_format(f)
+
+        for code, block, data in blocks(f, fmt):
+            if code == b"DNA1": return fmt, DNA(data(), fmt)
+
+    raise UnsupportedFile("%s has no DNA" % path)
@@ -0,0 +1,146 @@
+import argparse
+import os
+import secrets
+import subprocess
+import sys
+import threading
+import time
+
+from multiprocessing.connection import Client as Connection
+
+
+# send files to workers that keep running in the background
+# this runs outside Blender with a regular Python interpreter
+
+#   python -m project_furnace.client --port PORT FILE [FILE ...] --output DIRECTORY
+
+WORKER = os.path.join(os.path.dirname(os.path.abspath(__file__)), "worker.py")
+
+
+class Client:
+
+    # a connection to one worker
+    # the worker converts one file at a time
+
+    def __init__(self, port, authkey):
+        self.connection = Connection(("localhost", port), authkey=authkey)
+
+    def convert(self, source, output, progress=None, timeout=None):
+
+        self.connection.send({ "command": "convert", "source": source, "output": output })
+
+        # the worker sends progress until the file is done
+        # a worker that takes longer than the timeout is given up on
+
+        deadline = time.monotonic() + timeout if timeout else None
+
+        while True:
+
+            if deadline is not None and not self.connection.poll(max(deadline - time.monotonic(), 0)):
+                raise TimeoutError("The worker took longer than %g seconds" % timeout)
+
+            message = self.connection.recv()
+
+            if message["event"] == "result": return message["summary"]
+
+            if message["event"] == "error": raise RuntimeError(message["message"])
+
+            if progress: progress(message)
+
+    def stop(self):
+
+        self.connection.send({ "command": "stop" })
+        self.connection.recv()
+        self.connection.close()
+
+    def close(self):
+        self.connection.close()
+
+
+def drain(stream, path):
+
+    # keep reading what the worker prints so that it never blocks on a full pipe
+
+    with open(path, "a") as f:
+        for line in stream:
+            f.write(line)
+
+
+def start_worker(blender, authkey, log):
+
+    # start Blender in the background and wait until the worker is ready
+    # the worker says which port it is listening on once it is ready
+
+    environment = dict(os.environ, FURNACE_AUTHKEY=authkey.decode())
+
+    process = subprocess.Popen(
+        [ blender, "-b", "--python", WORKER, "--", "--serve", "0" ],
+        stdout=subprocess.PIPE,
+        stderr=subprocess.STDOUT,
+        text=True,
+        env=environment
+    )
+
+    for line in process.stdout:
+
+        if line.startswith("FURNACE worker listening on port"):
+
+            port = int(line.split()[-1])
+
+            threading.Thread(target=drain, args=(process.stdout, log), daemon=True).start()
+
+            return process, port
+
+    raise RuntimeError("The worker stopped before it was ready")
+
+
+def new_authkey():
+    return secrets.token_hex(16).encode()
+
+
+def arguments(argv=None):
+
+    parser = argparse.ArgumentParser(
+        prog="python -m project_furnace.client",
+        description="Send H3 levels to a FURNACE worker running in the background"
+    )
+
+    parser.add_argument("files", nargs="*", help=".blend files to convert")
+    parser.add_argument("-p", "--port", type=int, required=True, help="port the worker is listening on")
+    parser.add_argument("-o", "--output", default=os.getcwd(), help="directory for converted files and summaries")
+    parser.add_argument("--stop", action="store_true", help="stop the worker afterwards")
+
+    return parser.parse_args(argv)
+
+
+def main(argv=None):
+
+    args = arguments(argv)
+    authkey = os.environ.get("FURNACE_AUTHKEY", "")
+
+    # the key the worker was started with or the one it printed
+
+    if not authkey:
+        print("FURNACE_AUTHKEY needs to be set to the key of the worker", file=sys.stderr)
+        return 2
+
+    client = Client(args.port, authkey.encode())
+    progress = lambda message: print("%s: %s" % (os.path.basename(message["file"]), message["stage"]))
+
+    failed = 0
+
+    for source in args.files:
+
+        summary = client.convert(os.path.abspath(source), os.path.abspath(args.output), progress)
+
+        print("%s: %s" % (os.path.basename(source), summary["status"]))
+
+        if summary["status"] != "finished": failed += 1
+
+    if args.stop: client.stop()
+    else: client.close()
+
+    return 1 if failed else 0
+
+
+if __name__ == "__main__": sys.exit(main())
@@ -0,0 +1,153 @@
+import json
+import re
+
+import numpy
+
+from . import face_layers
+from . import materials
+from . import separation
+
+
+# the importer makes a new material every time it comes across the same material again
+# those end up with names like +portal.001 or glass_x.003 and the same settings
+# each group of such materials is merged into one before anything else is done
+
+SUFFIX = re.compile(r"\.\d{3,}$")
+
+
+def base_name(name):
+    return SUFFIX.sub("", name)
+
+
+def settings(material):
+
+    # every setting of the material for Halo
+    # two materials with the same settings and base name are the same material
+
+    flags = material.ass_jms
+
+    return {
+        p.identifier: face_layers.plain(getattr(flags, p.identifier))
+        for p in flags.bl_rna.properties if p.type not in ("POINTER", "COLLECTION")
+    }
+
+
+def canonical_key(material):
+
+    # colors are lists once they are plain values so the settings are kept as text
+
+    return (base_name(material.name), json.dumps(settings(material), sort_keys=True))
+
+
+def representative(names):
+
+    # the material without a number at the end if there is one
+    # otherwise the one with the lowest number
+
+    return min(names, key=lambda name: (name != base_name(name), len(name), name))
+
+
+def linked_to_object(obj):
+    return any(slot.link == "OBJECT" for slot in obj.material_slots)
+
+
+def find(used, objects=()):
+
+    # give each material that is a copy of another material
+    # the name of the material it should be replaced with
+
+    # the merge leaves objects with material slots linked to the object alone
+    # copies used by those objects stay as they are everywhere
+    # so that every material still in use after merging has a plan of its own
+
+    left = set()
+
+    for obj in objects:
+        if linked_to_object(obj): left.update(slot.material.name for slot in obj.material_slots if slot.material)
+
+    groups = {}
+
+    for material in used:
+
+        if not materials.is_halo(material): continue
+
+        groups.setdefault(canonical_key(material), []).append(material.name)
+
+    mapping = {}
+
+    for names in groups.values():
+
+        if len(names) < 2: continue
+
+        kept = representative(names)
+
+        for name in names:
+            if name != kept and name not in left: mapping[name] = kept
+
+    return mapping
+
+
+def merged_slots(obj, mapping, lookup):
+
+    # the materials of the object once the copies are replaced
+    # along with the new slot of each old slot
+    # nothing is given if nothing changes
+
+    if not mapping: return None
+
+    # material slots linked to the object are left alone
+
+    if linked_to_object(obj): return None
+
+    old = [ slot.material for slot in obj.material_slots ]
+
+    if not any(m and m.name in mapping for m in old): return None
+
+    new = []
+    remap = numpy.zeros(len(old), dtype=numpy.int32)
+
+    for index, material in enumerate(old):
+
+        if material and material.name in mapping: material = lookup(mapping[material.name])
+
+        # slots that end up with the same material become one slot
+
+        if material not in new: new.append(material)
+
+        remap[index] = new.index(material)
+
+    return new, remap
+
+
+def merged_indices(obj, remap):
+
+    # the new slot of every face
+    # faces with an index past the last slot use the last slot
+
+    indices = separation.material_indices(obj.data)
+
+    return remap[numpy.minimum(indices, len(remap) - 1)]
+
+
+def merge(obj, mapping, lookup):
+
+    merged = merged_slots(obj, mapping, lookup)
+
+    if merged is None: return 0
+
+    new, remap = merged
+
+    mesh = obj.data
+    indices = merged_indices(obj, remap)
+
+    # clearing the materials resets the index of every face
+    # so the new indices are written after the materials are added again
+
+    mesh.materials.clear()
+
+    for material in new:
+        mesh.materials.append(material)
+
+    mesh.polygons.foreach_set("material_index", indices)
+
+    return len(remap) - len(new)
@@ -0,0 +1,150 @@
+import hashlib
+
+import bpy
+import numpy
+
+from . import consolidation
+from . import roles
+
+
+# levels imported from ASS files often have the same geometry stored many times
+# each copy is a mesh of its own even when it is exactly the same as the others
+# find those copies so that they can share one mesh as instance geometry
+
+# the copies are placed, turned and scaled by their objects
+# so only the geometry of the meshes themselves is compared
+# and an object that uses the mesh of another keeps its own placement
+
+# positions are rounded to this many decimal places before being compared
+# writing the same geometry out again leaves tiny differences in the last few digits
+
+DECIMALS = 4
+
+
+def local_positions(mesh):
+
+    # the position of every vertex relative to the object
+
+    positions = numpy.zeros(len(mesh.vertices) * 3, dtype=numpy.float64)
+    mesh.vertices.foreach_get("co", positions)
+
+    # adding zero turns the -0.0 left by rounding into 0.0 so that both give the same digest
+
+    return numpy.round(positions.reshape(-1, 3), DECIMALS) + 0.0
+
+
+def topology(mesh):
+
+    # the vertices of each face in order
+
+    loops = numpy.zeros(len(mesh.loops), dtype=numpy.int32)
+    mesh.loops.foreach_get("vertex_index", loops)
+
+    sizes = numpy.zeros(len(mesh.polygons), dtype=numpy.int32)
+    mesh.polygons.foreach_get("loop_total", sizes)
+
+    return loops, sizes
+
+
+def material_assignment(obj, mapping=None):
+
+    # the materials as they will be once copies of the same material are merged
+
+    merged = consolidation.merged_slots(obj, mapping, bpy.data.materials.get)
+
+    if merged:
+        slot_materials, remap = merged
+        indices = consolidation.merged_indices(obj, remap)
+    else:
+        slot_materials = [ slot.material for slot in obj.material_slots ]
+        indices = numpy.zeros(len(obj.data.polygons), dtype=numpy.int32)
+        obj.data.polygons.foreach_get("material_index", indices)
+
+    names = [ m.name if m else "" for m in slot_materials ]
+
+    return indices, names
+
+
+def geometry(obj, mapping=None):
+
+    # everything that has to be the same for two objects to be copies of each other
+
+    positions = local_positions(obj.data)
+    loops, sizes = topology(obj.data)
+    indices, names = material_assignment(obj, mapping)
+
+    return positions, loops, sizes, indices, names
+
+
+def digest(parts):
+
+    positions, loops, sizes, indices, names = parts
+
+    h = hashlib.blake2b(digest_size=16)
+
+    for array in (positions, loops, sizes, indices):
+        h.update(array.shape.__repr__().encode())
+        h.update(numpy.ascontiguousarray(array).tobytes())
+
+    h.update("\0".join(names).encode())
+
+    return h.hexdigest()
+
+
+def same(a, b):
+
+    # the digests of two objects were the same
+    # make sure the geometry really is the same
+
+    return all(numpy.array_equal(x, y) for x, y in zip(a[:4], b[:4])) and a[4] == b[4]
+
+
+def can_be_instance(obj):
+
+    # geometry for portals and the sky and seam sealers has to stay as it is
+
+    for record in roles.slots(obj):
+        if record.portal or record.sky or record.seam_sealer: return False
+
+    return True
+
+
+def search(objects, mapping=None):
+
+    # group the objects by the digest of their geometry
+    # the first object of each group keeps its mesh and the others use it too
+
+    # give each object that is a copy of an earlier one the name of that object
+
+    # this yields after each object so that the search can be paused in between
+
+    first = {}
+    found = {}
+
+    for obj in objects:
+
+        mesh = obj.data
+
+        if not len(mesh.polygons): continue
+        if not can_be_instance(obj): continue
+
+        # a mesh that is already shared is left as it is
+
+        if mesh.users - mesh.use_fake_user > 1: continue
+
+        yield
+
+        parts = geometry(obj, mapping)
+        key = digest(parts)
+
+        if key not in first:
+            first[key] = (obj, parts)
+            continue
+
+        original, original_parts = first[key]
+
+        if not same(parts, original_parts): continue
+
+        found[obj.name] = original.name
+
+    return found
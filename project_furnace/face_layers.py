@@ -0,0 +1,281 @@
+import bpy
+import json
+import numpy
+import uuid
+
+
+# the face properties Foundry sets up for each option of its operators
+# each option has a name shown in the Foundry UI and the properties it overrides
+
+LAYERS = {
+    "two_sided": ("Two Sided", { "face_two_sided_override": True }),
+    "transparent": ("Transparent", { "face_transparent_override": True }),
+    "render_only": ("Render Only", {
+        "face_mode_override": True,
+        "face_mode_ui": "_connected_geometry_face_mode_render_only"
+    }),
+    "collision_only": ("Collision Only", {
+        "face_mode_override": True,
+        "face_mode_ui": "_connected_geometry_face_mode_collision_only"
+    }),
+    "sphere_collision_only": ("Sphere Collision Only", {
+        "face_mode_override": True,
+        "face_mode_ui": "_connected_geometry_face_mode_sphere_collision_only"
+    }),
+    "shadow_only": ("Shadow Only", {
+        "face_mode_override": True,
+        "face_mode_ui": "_connected_geometry_face_mode_shadow_only"
+    }),
+    "lightmap_only": ("Lightmap Only", {
+        "face_mode_override": True,
+        "face_mode_ui": "_connected_geometry_face_mode_lightmap_only"
+    }),
+    "breakable": ("Breakable", {
+        "face_mode_override": True,
+        "face_mode_ui": "_connected_geometry_face_mode_breakable"
+    }),
+    "ladder": ("Ladder", { "ladder_override": True }),
+    "slip_surface": ("Slip Surface", { "slip_surface_override": True }),
+    "decal_offset": ("Decal Offset", { "decal_offset_override": True }),
+    "no_shadow": ("No Shadow", { "no_shadow_override": True }),
+    "precise_position": ("Precise Position", { "precise_position_override": True }),
+    "emissive": ("Emissive", { "emissive_override": True }),
+    "_connected_geometry_face_type_sky": ("Sky", {
+        "face_type_override": True,
+        "face_type_ui": "_connected_geometry_face_type_sky"
+    }),
+    "_connected_geometry_face_type_seam_sealer": ("Seam Sealer", {
+        "face_type_override": True,
+        "face_type_ui": "_connected_geometry_face_type_seam_sealer"
+    }),
+    "lightmap_resolution_scale": ("Lightmap Resolution Scale", {
+        "lightmap_resolution_scale_override": True
+    }),
+    "lightmap_additive_transparency": ("Lightmap Additive Transparency", {
+        "lightmap_additive_transparency_override": True
+    }),
+    "lightmap_translucency_tint_color": ("Lightmap Translucency Tint Color", {
+        "lightmap_translucency_tint_color_override": True
+    })
+}
+
+# these options belong to a different operator in Foundry
+
+LIGHTMAP_OPTIONS = {
+    "lightmap_resolution_scale",
+    "lightmap_additive_transparency",
+    "lightmap_translucency_tint_color"
+}
+
+# the face attribute with the face properties of each face as a bitmask
+# each bit stands for one of the face properties used by the mesh
+
+FLAGS = "furnace_face_flags"
+
+# the attribute holds signed 32-bit integers
+
+BITS = 31
+
+# besides the overrides listed above
+# these properties are needed to write face properties directly
+
+REQUIRED = { "name", "layer_name", "face_count" }
+
+
+def supported():
+
+    # the properties of face properties have changed between versions of Foundry
+    # check that everything needed to write them directly is actually there
+
+    try:
+        item = bpy.types.Mesh.bl_rna.properties["nwo"].fixed_type
+        item = item.properties["face_props"].fixed_type
+    except (AttributeError, KeyError):
+        return False
+
+    names = set(item.properties.keys())
+
+    if not REQUIRED <= names: return False
+
+    for label, overrides in LAYERS.values():
+        if not set(overrides) <= names: return False
+
+    return True
+
+
+def layer_name(option):
+
+    # each face layer needs a unique name for its face attribute
+
+    return "layer_face_" + option + "_" + uuid.uuid4().hex[:8]
+
+
+class OperatorLayers:
+
+    # add face properties with the Foundry operators
+    # the faces should already be selected in Edit Mode
+
+    def __init__(self, mesh):
+        self.mesh = mesh
+
+    def add(self, option):
+
+        if option in LIGHTMAP_OPTIONS:
+            bpy.ops.nwo.face_layer_add_lightmap(options=option)
+        else:
+            bpy.ops.nwo.face_layer_add(options=option)
+
+        return self.mesh.nwo.face_props[-1]
+
+    def extend(self, option):
+        bpy.ops.nwo.face_prop_add(options=option)
+
+
+class DataLayers:
+
+    # add face properties directly to the mesh
+    # the faces are given as a mask with one value for each face
+
+    def __init__(self, mesh, mask):
+        self.mesh = mesh
+        self.mask = mask
+
+    def add(self, option):
+
+        # the face attribute tells Foundry which faces use the face properties
+
+        name = layer_name(option)
+
+        attribute = self.mesh.attributes.new(name, "INT", "FACE")
+        attribute.data.foreach_set("value", self.mask)
+
+        # add the face properties themselves
+        # and set them up in the same way that the Foundry operators do
+
+        face_props = self.mesh.nwo.face_props
+
+        item = face_props.add()
+        item.layer_name = name
+        item.face_count = int(self.mask.sum())
+
+        self.mesh.nwo.face_props_index = len(face_props) - 1
+
+        self.extend(option, item)
+
+        return item
+
+    def extend(self, option, item=None):
+
+        if item is None: item = self.mesh.nwo.face_props[-1]
+
+        label, overrides = LAYERS[option]
+
+        if not item.name: item.name = label
+
+        for p, v in overrides.items():
+            setattr(item, p, v)
+
+
+def face_masks(obj):
+
+    # read the material index of every face once
+    # and work out which faces use each material slot
+    # faces with an index past the last slot use the last slot
+
+    count = len(obj.material_slots)
+
+    indices = numpy.zeros(len(obj.data.polygons), dtype=numpy.int32)
+    obj.data.polygons.foreach_get("material_index", indices)
+
+    indices = numpy.minimum(indices, max(count - 1, 0))
+
+    for index in range(count):
+
+        mask = (indices == index).astype(numpy.int32)
+
+        yield index, mask
+
+
+def plain(value):
+
+    # colors and other arrays are kept as lists so they can be saved as JSON
+
+    if isinstance(value, (bool, int, float, str)): return value
+
+    return [ plain(v) for v in value ]
+
+
+class RecordedItem:
+
+    # stands in for face properties while they are being planned
+    # every property set on it is kept in the given dictionary
+
+    def __init__(self, values):
+        object.__setattr__(self, "values", values)
+
+    def __setattr__(self, name, value):
+        self.values[name] = plain(value)
+
+
+class RecordedLayers:
+
+    # keep the face properties that would be added instead of adding them
+    # the face properties can be added later to any mesh with replay
+
+    def __init__(self):
+        self.layers = []
+
+    def add(self, option):
+
+        layer = { "option": option, "extend": [], "values": {} }
+        self.layers.append(layer)
+
+        return RecordedItem(layer["values"])
+
+    def extend(self, option):
+        self.layers[-1]["extend"].append(option)
+
+
+def layer_key(layer):
+
+    # recorded face properties that are the same give the same key
+
+    return json.dumps(layer, sort_keys=True)
+
+
+def combine(layers):
+
+    # one face layer with everything the given face layers set up
+    # the first one is added and the others extend it
+
+    first = layers[0]
+
+    extend = list(first["extend"])
+    values = dict(first["values"])
+
+    for layer in layers[1:]:
+
+        extend.append(layer["option"])
+        extend.extend(layer["extend"])
+
+        values.update(layer["values"])
+
+    if len(layers) > 1 and "name" not in values:
+        values["name"] = " + ".join(LAYERS[layer["option"]][0] for layer in layers)
+
+    return { "option": first["option"], "extend": extend, "values": values }
+
+
+def replay(layers, writer):
+
+    # add face properties that were recorded earlier
+
+    for layer in layers:
+
+        item = writer.add(layer["option"])
+
+        for option in layer["extend"]:
+            writer.extend(option)
+
+        for p, v in layer["values"].items():
+            setattr(item, p, v)
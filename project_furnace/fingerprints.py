@@ -0,0 +1,110 @@
+import hashlib
+import json
+
+from . import face_layers
+
+
+# a fingerprint is kept on every object and material that has been converted
+# a later run compares it with a new fingerprint to know what has changed since
+# anything with the same fingerprint as before is left alone
+
+KEY = "furnace_fingerprint"
+
+# the face properties added during the last run
+# kept on the mesh so that they can be removed before being added again
+
+LAYERS = "furnace_layers"
+
+
+def digest(data):
+
+    # keys are sorted so that the same data always gives the same fingerprint
+
+    text = json.dumps(data, sort_keys=True, separators=(",", ":"))
+
+    return hashlib.blake2b(text.encode(), digest_size=16).hexdigest()
+
+
+def material_fingerprint(name, entry):
+
+    # the planned entry of a material already depends on its name and its flags
+    # including those enabled by the special symbols in the name
+
+    return digest([ name, entry ])
+
+
+def object_fingerprint(obj, material_prints):
+
+    # the name matters for instance geometry
+    # the materials matter for everything else
+
+    mesh = obj.data
+
+    slots = []
+
+    for slot in obj.material_slots:
+        name = slot.material.name if slot.material else ""
+        slots.append([ name, material_prints.get(name, "") ])
+
+    topology = [ len(mesh.vertices), len(mesh.edges), len(mesh.polygons), len(mesh.loops) ]
+
+    return digest([ obj.name, slots, topology ])
+
+
+def stored(block):
+    return block.get(KEY, "")
+
+
+def store(block, fingerprint):
+    block[KEY] = fingerprint
+
+
+def changed(block, fingerprint):
+    return stored(block) != fingerprint
+
+
+def forget_layers(mesh):
+
+    # remove the face properties added to the mesh during the last run
+    # along with the face attributes that go with them
+    # face properties added by hand are left alone
+
+    # the bitmask of each face is worked out again every run
+
+    attribute = mesh.attributes.get(face_layers.FLAGS)
+
+    if attribute is not None: mesh.attributes.remove(attribute)
+
+    names = set(mesh.get(LAYERS, []))
+
+    if not names: return 0
+
+    face_props = mesh.nwo.face_props
+
+    removed = 0
+
+    for index in reversed(range(len(face_props))):
+
+        if face_props[index].layer_name not in names: continue
+
+        face_props.remove(index)
+        removed += 1
+
+    for name in names:
+
+        attribute = mesh.attributes.get(name)
+
+        if attribute is not None: mesh.attributes.remove(attribute)
+
+    mesh.nwo.face_props_index = max(len(face_props) - 1, 0)
+
+    del mesh[LAYERS]
+
+    return removed
+
+
+def remember_layers(mesh, names):
+
+    # keep the names of every face layer this run added to the mesh
+
+    mesh[LAYERS] = list(mesh.get(LAYERS, [])) + list(names)
@@ -0,0 +1,187 @@
+import bpy
+import json
+import numpy
+
+from . import roles
+from . import separation
+
+
+# pick the lightmap resolution scale of each material so that the whole level fits a budget
+# the face area of each material is added up over the level
+# and the scales are raised or lowered together until the lightmaps fit
+
+# Foundry only allows whole numbers in the range [0, 7] and uses 3 by default
+
+LOWEST = 0
+HIGHEST = 7
+DEFAULT = 3
+
+# each step of the scale is taken to double the number of texels for the same area
+# at the default scale a square unit of area gets this many texels
+
+STEP = 2.0
+DENSITY = 1.0
+
+# the lightmap resolution in materials for Halo 3 is relative to 1
+# a resolution of 0 is treated as the smallest resolution there is
+
+SMALLEST = STEP ** -HIGHEST
+
+# materials that never end up in a lightmap
+
+UNLIT = ( "collision_only", "sphere_collision_only", "ignored_by_lightmaps" )
+
+
+def is_lit(record):
+
+    if not record.halo: return False
+
+    if record.portal or record.sky or record.seam_sealer: return False
+
+    return not any(flag in record.flags for flag in UNLIT)
+
+
+def object_areas(obj):
+
+    # the area of the faces using each material slot of the object
+    # measured in the world so that scaled objects count as they appear
+
+    mesh = obj.data
+
+    areas = numpy.zeros(len(mesh.polygons), dtype=numpy.float64)
+    mesh.polygons.foreach_get("area", areas)
+
+    # faces with an index past the last slot use the last slot
+
+    count = len(obj.material_slots)
+    indices = numpy.minimum(separation.material_indices(mesh), max(count - 1, 0))
+
+    # the scale of the object is taken to be about the same in every direction
+
+    scale = abs(obj.matrix_world.to_3x3().determinant()) ** (2 / 3)
+
+    return numpy.bincount(indices, weights=areas, minlength=count) * scale
+
+
+def material_areas(objects, mapping=None):
+
+    # the area of every material over all the given objects
+    # copies of a material count toward the material they are merged into
+
+    # this yields after each object so that the work can be paused in between
+
+    mapping = mapping or {}
+    totals = {}
+
+    for obj in objects:
+
+        areas = object_areas(obj)
+
+        for index, slot in enumerate(obj.material_slots):
+
+            material = slot.material
+
+            if material is None or not is_lit(roles.material(material)): continue
+
+            name = mapping.get(material.name, material.name)
+            totals[name] = totals.get(name, 0.0) + float(areas[index])
+
+        yield
+
+    return totals
+
+
+def texels(areas, scales, density=DENSITY):
+    return areas * density * STEP ** (scales - DEFAULT)
+
+
+def threshold_scales(resolutions):
+
+    # the scales given by the fixed thresholds used without a budget
+    # materials with a resolution of exactly 1 keep the default of Foundry
+
+    return numpy.where(resolutions < 1.0, 1, numpy.where(resolutions > 1.0, 5, DEFAULT))
+
+
+def solve(areas, resolutions, budget, density=DENSITY):
+
+    # materials keep the resolution they had relative to each other in Halo 3
+    # a single offset is added to every scale and the largest offset that fits the budget is used
+
+    base = DEFAULT + numpy.log(numpy.maximum(resolutions, SMALLEST)) / numpy.log(STEP)
+
+    def scales(offset):
+        return numpy.clip(numpy.rint(base + offset), LOWEST, HIGHEST)
+
+    def total(offset):
+        return texels(areas, scales(offset), density).sum()
+
+    # the total only grows as the offset grows
+    # so the offset can be found by halving the range again and again
+
+    low = LOWEST - base.max(initial=0) - 1
+    high = HIGHEST - base.min(initial=0) + 1
+
+    if total(low) > budget: return scales(low).astype(numpy.int32)
+
+    for i in range(48):
+
+        middle = (low + high) / 2
+
+        if total(middle) <= budget: low = middle
+        else: high = middle
+
+    return scales(low).astype(numpy.int32)
+
+
+def analyze(objects, budget, mapping=None, density=DENSITY):
+
+    # the scale of every material and what the lightmaps would come to
+    # along with what they would have come to with the fixed thresholds
+
+    # the areas are measured one object at a time and the report is returned at the end
+
+    areas_by_name = yield from material_areas(objects, mapping)
+
+    names = sorted(areas_by_name)
+
+    areas = numpy.array([ areas_by_name[n] for n in names ], dtype=numpy.float64)
+    resolutions = numpy.array([ bpy.data.materials[n].ass_jms.lightmap_res for n in names ], dtype=numpy.float64)
+
+    chosen = solve(areas, resolutions, budget, density)
+    before = threshold_scales(resolutions)
+
+    after = texels(areas, chosen, density)
+    previous = texels(areas, before, density)
+
+    return {
+        "budget": budget,
+        "density": density,
+        "materials": {
+            name: {
+                "area": float(areas[i]),
+                "lightmap_res": float(resolutions[i]),
+                "scale": int(chosen[i]),
+                "texels": float(after[i]),
+                "threshold_scale": int(before[i])
+            }
+            for i, name in enumerate(names)
+        },
+        "texels": float(after.sum()),
+        "threshold_texels": float(previous.sum()),
+
+        # the side of a square lightmap with as many texels
+
+        "size": int(numpy.ceil(numpy.sqrt(after.sum()))),
+        "threshold_size": int(numpy.ceil(numpy.sqrt(previous.sum())))
+    }
+
+
+def material_scales(report):
+    return { name: entry["scale"] for name, entry in report["materials"].items() }
+
+
+def save(report, path):
+
+    with open(path, "w") as f:
+        json.dump(report, f, indent=4, sort_keys=True)
@@ -1,11 +1,18 @@
 import bpy
-
-from . import instance_geometry
-from . import materials
-from . import portals
-from . import glass
-
+import os
+import time
+
+from . import applier
+from . import ass_import
+from . import lightmap
+from . import orphans
+from . import planner
+from . import profiling
+from . import scheduler
+
+from bpy.props import BoolProperty, FloatProperty, StringProperty
 from bpy.types import Operator, Panel
+from bpy_extras.io_utils import ImportHelper
 
 
 class FURNACE_PT_Panel(Panel):
@@ -21,7 +28,84 @@ class FURNACE_PT_Panel(Panel):
 
     def draw(self, context):
         row = self.layout.row()
-        row.operator("FURNACE.main", text="Go")
+        row.operator("FURNACE.main_modal", text="Go")
+
+        # objects that have not changed since the last run are normally skipped
+
+        row = self.layout.row()
+        row.operator("FURNACE.main_modal", text="Redo All").force = True
+
+        self.layout.prop(context.window_manager, "furnace_verify")
+        self.layout.prop(context.window_manager, "furnace_instances")
+        self.layout.prop(context.window_manager, "furnace_lightmap_budget")
+
+
+def megabytes(size):
+    return "%.0f MB" % (size / 2 ** 20)
+
+
+class FURNACE_PT_Profile(Panel):
+
+    bl_space_type = "VIEW_3D"
+    bl_region_type = "UI"
+
+    bl_category = "Foundry"
+    bl_label = "Profile"
+
+    bl_parent_id = "FURNACE_PT_Panel"
+    bl_options = {"DEFAULT_CLOSED"}
+
+
+    def draw(self, context):
+
+        layout = self.layout
+
+        layout.prop(context.window_manager, "furnace_profile")
+
+        report = profiling.last
+
+        if report is None: return
+
+        # the time of each phase of the last run that was measured
+
+        box = layout.box()
+        box.label(text="Total: %.3f s" % report["total"])
+
+        # the memory used before and after the run
+        # the peak is the most the process has ever used so far
+
+        memory = report["memory"]
+
+        if memory["peak_after"] is not None:
+            box.label(text="Peak Memory: %s before, %s after" % (
+                megabytes(memory["peak_before"]),
+                megabytes(memory["peak_after"])
+            ))
+
+        if memory["after"] is not None:
+            box.label(text="Memory: %s before, %s after" % (
+                megabytes(memory["before"]),
+                megabytes(memory["after"])
+            ))
+
+        for name, seconds in report["phases"].items():
+            box.label(text="%s: %.3f s" % (name.capitalize(), seconds))
+
+        # the operators called the most
+
+        box = layout.box()
+        box.label(text="Operators")
+
+        for name, count in list(report["operators"].items())[:10]:
+            box.label(text="%s: %d" % (name, count))
+
+        # the objects that took the longest
+
+        box = layout.box()
+        box.label(text="Slowest Objects")
+
+        for entry in report["slowest"]:
+            box.label(text="%s: %.3f s" % (entry["object"], entry["time"]))
 
 
 class FURNACE_Main(Operator):
@@ -31,176 +115,376 @@ class FURNACE_Main(Operator):
     bl_idname = "FURNACE.main"
     bl_label = "Prepare H3 ASS for import to Reach"
 
+    # the whole run can be undone in one step
+    # operators called from Python during the run do not store undo steps of their own
+
+    bl_options = {"REGISTER", "UNDO"}
 
-    def select_none(self):
+    force: BoolProperty(
+        name="Redo All",
+        description="Convert every object again, including those that have not changed since the last run",
+        default=False
+    )
 
-        if bpy.context.mode != "OBJECT":
-            bpy.ops.object.mode_set(mode="OBJECT")
 
-        bpy.ops.object.select_all(action="DESELECT")
-        bpy.context.view_layer.objects.active = None
+    def store_selection(self, context):
 
+        # remember what the user had selected before doing anything
+        # the selection is restored once everything is done
 
-    def select_object(self, obj):
+        active = context.view_layer.objects.active
+        selected = list(context.selected_objects)
 
-        if bpy.context.mode != "OBJECT":
-            bpy.ops.object.mode_set(mode="OBJECT")
+        # nothing should be selected while the operators run
+        # operators in Edit Mode would otherwise work on those objects too
 
-        obj.select_set(True)
-        bpy.context.view_layer.objects.active = obj
+        for obj in selected:
+            obj.select_set(False)
 
+        return active, selected
 
-    def is_valid(self, obj): 
 
-        # if the object is hidden for some reason
-        # the object probably should be ignored
+    def restore_selection(self, context, selection):
 
-        if obj.hide_get(): return False
+        active, selected = selection
+
+        for obj in selected:
+
+            # the object might not be in the view layer anymore
+
+            try: obj.select_set(True)
+            except (ReferenceError, RuntimeError): continue
+
+        context.view_layer.objects.active = active
+
+
+    def execute(self, context):
 
-        # verify that the object has properties set up and used by Foundry
-        # nothing can be done if those are not there for whatever reason
+        # the selection of the user is left as it was
+
+        selection = self.store_selection(context)
+
+        # nothing is measured unless profiling is turned on in the sidebar
 
         try:
+            with profiling.run(context.window_manager.furnace_profile):
+                applied = self.convert()
+        finally: self.restore_selection(context, selection)
 
-            # assume the attribute exists and try to access it to verify its existence
-            # try to continue if doing this leads to an exception
+        self.report({"INFO"}, self.summary(applied))
 
-            if not obj.get("nwo") and not obj.nwo: return False
+        return {"FINISHED"}
 
-        except:
 
-            print("ERROR: Please go ensure that Foundry is installed")
-            return False
-        
-        # ignore objects that seem to be of the wrong type
+    def summary(self, applied):
 
-        if obj.type != "MESH": return False
+        # materials left unused by pruning and merging are among the freed materials
 
-        # the object meets all the requirements
-        
-        return True
-    
+        freed = applied.orphans.freed if applied.orphans else { kind: 0 for kind in orphans.KINDS }
 
-    def prepare_scene(self):
+        summary = "Removed %d unused material slots, merged %d slots, %d objects were unchanged, freed %d meshes, %d materials and %d images" % (
+            applied.slots_removed,
+            applied.slots_merged,
+            applied.skipped,
+            freed["meshes"],
+            freed["materials"],
+            freed["images"]
+        )
 
-        # directly change the asset type to the correct type
-        # without actually interacting with the Foundry UI
+        # the objects are listed in the console
 
-        bpy.data.scenes["Scene"].nwo.asset_type = "SCENARIO"
+        if applied.mismatches:
+            summary += ", %d object properties did not stick" % len(applied.mismatches)
 
-        # ensure the data of all objects are independent of each other
+        return summary
 
-        bpy.ops.object.make_single_user(type="ALL", obdata=True)
 
-        # geometry for portals might be part of any object
-        # that means all the objects need to be examined
+    def planning(self, context):
 
-        for obj in bpy.data.objects:
+        # work out the plan one piece at a time
+        # each piece is measured on its own so that time spent paused is not counted
 
-            # this project is intended to work with meshes and with Foundry
-            # skip to the next object if this object fails to meet the requirements
+        # with a lightmap budget the scales picked for each material
+        # are saved in a report next to the .blend file
 
-            if not self.is_valid(obj): continue
+        wm = context.window_manager
+        budget = wm.furnace_lightmap_budget * 1e6
 
-            # remove unused material slots before moving on
-            
-            bpy.ops.object.material_slot_remove_unused()
+        steps = planner.planning(force=self.force, instances=wm.furnace_instances, budget=budget or None)
 
-            # separate any geometry intended to be glass
-            # two-sided geometry for levels should be separate
+        while True:
 
-            if glass.has_glass(obj):
+            try:
+                with profiling.phase("plan"): next(steps)
+            except StopIteration as done:
+                plan = done.value
+                break
 
-                # enter Edit Mode to work with the geometry
-                # return to Object Mode for the next step
+            yield "plan"
 
-                self.select_none()
-                self.select_object(obj)
-                bpy.ops.object.mode_set(mode="EDIT")
+        report = plan["lightmap"]
 
-                glass.separate_by_material(obj)
+        if report and bpy.data.filepath:
+            lightmap.save(report, os.path.splitext(bpy.data.filepath)[0] + ".lightmap.json")
 
-                bpy.ops.object.mode_set(mode="OBJECT")
+        if report:
+            print("Lightmaps: %d texels (%d x %d) instead of %d texels (%d x %d)" % (
+                report["texels"], report["size"], report["size"],
+                report["threshold_texels"], report["threshold_size"], report["threshold_size"]
+            ))
 
-            # remove unused material slots again
-            
-            bpy.ops.object.material_slot_remove_unused()
+        return plan
 
-            # separate any geometry intended for setting up portals
-            # portals are expected to be separate from other geometry
 
-            if portals.for_portals(obj):
+    def make_plan(self, context):
+        return scheduler.complete(self.planning(context))
 
-                # switch to Edit Mode to work with the geometry
-                # return to Object Mode for the next step
 
-                self.select_none()
-                self.select_object(obj)
-                bpy.ops.object.mode_set(mode="EDIT")
+    def convert(self):
 
-                portals.separate_by_material(obj)
+        # work out everything that needs to be done first
+        # without changing anything in the scene
 
-                bpy.ops.object.mode_set(mode="OBJECT")
+        plan = self.make_plan(bpy.context)
 
-            # remove unused material slots again
-            
-            bpy.ops.object.material_slot_remove_unused()
+        # then carry out the plan
 
+        return applier.apply(plan, bpy.context.window_manager.furnace_verify)
 
-    def execute(self, context):
 
-        # to avoid some strange problems and quirks
-        # there are a number of things that need to be done first
+class FURNACE_MainModal(FURNACE_Main):
+
+    """Prepare H3 ASS for import to Reach while keeping Blender responsive"""
+
+    bl_idname = "FURNACE.main_modal"
+    bl_label = "Prepare H3 ASS for import to Reach"
+
+    bl_options = {"REGISTER", "UNDO"}
+
+    # the work is done a little at a time whenever the timer goes off
+    # each time stops once it has taken longer than this many seconds
+    # a single object that takes longer than this is still done all at once
+
+    interval = 0.02
+    budget = 0.05
 
-        self.prepare_scene()
+    # events that only move the view around are let through while the run goes on
+    # anything else like editing or undoing would change the scene under the run
 
-        # for each object in the scene
-        # set up object properties and face properties
-        # according to various bits of data for the object
-        # including the materials that the object uses
+    navigation = {
+        "MOUSEMOVE", "INBETWEEN_MOUSEMOVE",
+        "MIDDLEMOUSE", "WHEELUPMOUSE", "WHEELDOWNMOUSE", "WHEELINMOUSE", "WHEELOUTMOUSE",
+        "TRACKPADPAN", "TRACKPADZOOM", "MOUSEROTATE", "MOUSESMARTZOOM", "NDOF_MOTION",
+        "NUMPAD_0", "NUMPAD_1", "NUMPAD_2", "NUMPAD_3", "NUMPAD_4", "NUMPAD_5",
+        "NUMPAD_6", "NUMPAD_7", "NUMPAD_8", "NUMPAD_9", "NUMPAD_PERIOD", "NUMPAD_PLUS", "NUMPAD_MINUS"
+    }
 
-        for obj in bpy.data.objects:
 
-            # this project is intended to work with meshes and with Foundry
-            # skip to the next object if this object fails to meet the requirements
+    def invoke(self, context, event):
 
-            if not self.is_valid(obj): continue
+        # without a window there is nothing to keep responsive
 
-            # enter Edit Mode to set up face properties
-            # return to Object Mode for the next step
+        if context.window is None: return self.execute(context)
 
-            self.select_none()
-            self.select_object(obj)
-            bpy.ops.object.mode_set(mode="EDIT")
+        self.selection = self.store_selection(context)
+        self.timer = None
+
+        # the selection is given back and measuring stops if the run cannot start
+
+        try:
 
-            materials.set_face_properties(obj)
+            profiling.start(context.window_manager.furnace_profile)
 
-            bpy.ops.object.mode_set(mode="OBJECT")
+            # the plan is made a little at a time as well
+            # the applier only exists once the plan is done
 
-            # for levels that are originally from Halo 3 and Halo 3: ODST
-            # this is the most appropriate default mesh type
+            self.applier = None
+            self.steps = self.work()
+            self.stage = None
 
-            obj.nwo.mesh_type_ui = "_connected_geometry_mesh_type_structure"
+            wm = context.window_manager
 
-            # set the object properties according to the mesh type
+            wm.progress_begin(0, 100)
 
-            if portals.for_portals(obj):
-                portals.set_object_properties(obj)
+            self.timer = wm.event_timer_add(self.interval, window=context.window)
+            wm.modal_handler_add(self)
 
-            if instance_geometry.for_instance_geometry(obj):
-                instance_geometry.set_object_properties(obj)
+        except Exception:
+            self.clean_up(context)
+            raise
+
+        return {"RUNNING_MODAL"}
+
+
+    def work(self):
+
+        context = bpy.context
+
+        plan = yield from self.planning(context)
+
+        self.applier = applier.Applier(plan, context.window_manager.furnace_verify)
+
+        yield from self.applier.steps()
+
+
+    def modal(self, context, event):
+
+        # stop before the next piece of work
+        # everything done so far stays done and can be undone in one step
+
+        if event.type == "ESC":
+            return self.finish(context, cancelled=True)
+
+        if event.type != "TIMER":
+            return {"PASS_THROUGH"} if event.type in self.navigation else {"RUNNING_MODAL"}
+
+        start = time.perf_counter()
+
+        try:
+
+            while time.perf_counter() - start < self.budget:
+                self.stage = next(self.steps)
+
+        except StopIteration:
+            return self.finish(context)
+
+        except Exception:
+            self.finish(context, cancelled=True)
+            raise
+
+        progress = self.applier.progress() if self.applier else 0.0
+
+        context.window_manager.progress_update(int(progress * 100))
+        context.workspace.status_text_set("FURNACE: %s %d%% (Esc to cancel)" % (
+            self.stage or "preparing",
+            progress * 100
+        ))
+
+        return {"RUNNING_MODAL"}
+
+
+    def clean_up(self, context):
+
+        wm = context.window_manager
+
+        if self.timer is not None: wm.event_timer_remove(self.timer)
+
+        wm.progress_end()
+
+        context.workspace.status_text_set(None)
+
+        profiling.stop()
+
+        self.restore_selection(context, self.selection)
+
+
+    def finish(self, context, cancelled=False):
+
+        # objects that went through every stage are remembered even if the run was stopped
+
+        if cancelled:
+            self.steps.close()
+            if self.applier: self.applier.finish()
+
+        self.clean_up(context)
+
+        if cancelled:
+            self.report({"WARNING"}, "Stopped while in the %s stage, %d objects were finished" % (
+                self.stage or "first",
+                len(self.applier.queue.done[scheduler.OBJECT_PROPERTIES]) if self.applier else 0
+            ))
+        else:
+            self.report({"INFO"}, self.summary(self.applier))
+
+        # the run still counts as finished so that what was done can be undone
 
         return {"FINISHED"}
 
 
-classes = [ FURNACE_PT_Panel, FURNACE_Main ]
+class FURNACE_ImportASS(Operator, ImportHelper):
+
+    # build the level straight from an ASS file
+    # without going through the importer of the Halo toolset
+
+    bl_idname = "FURNACE.import_ass"
+    bl_label = "Import ASS (FURNACE)"
+    bl_description = "Import a Halo 3 ASS file with its geometry already split for Foundry"
+    bl_options = {"REGISTER", "UNDO"}
+
+    filename_ext = ".ass"
+    filter_glob: StringProperty(default="*.ass", options={"HIDDEN"})
+
+    scale: FloatProperty(
+        name="Scale",
+        description="Scale applied to every object in the file",
+        default=1.0,
+        min=0.0001
+    )
+
+    def execute(self, context):
+
+        start = time.perf_counter()
+
+        # files that are empty or cut short are reported instead of raising
+
+        try: objects = ass_import.load(self.filepath, context.scene, self.scale)
+        except EOFError as e:
+
+            self.report({"ERROR"}, "Could not import %s: %s" % (os.path.basename(self.filepath), e))
+
+            return {"CANCELLED"}
+
+        self.report({"INFO"}, "Imported %d objects in %.2f seconds" % (len(objects), time.perf_counter() - start))
+
+        return {"FINISHED"}
+
+
+def import_menu(self, context):
+    self.layout.operator(FURNACE_ImportASS.bl_idname, text="Halo 3 ASS (FURNACE) (.ass)")
+
+
+classes = [ FURNACE_PT_Panel, FURNACE_PT_Profile, FURNACE_Main, FURNACE_MainModal, FURNACE_ImportASS ]
 
 def register():
     for c in classes:
         bpy.utils.register_class(c)
+
+    bpy.types.TOPBAR_MT_file_import.append(import_menu)
+
+    bpy.types.WindowManager.furnace_profile = BoolProperty(
+        name="Measure Next Run",
+        description="Measure the time of each phase and count the operators called during the next run",
+        default=False
+    )
+
+    bpy.types.WindowManager.furnace_verify = BoolProperty(
+        name="Check Object Properties",
+        description="Read the object properties back after writing them and report any that did not stick",
+        default=False
+    )
+
+    bpy.types.WindowManager.furnace_instances = BoolProperty(
+        name="Share Duplicate Meshes",
+        description="Let objects with exactly the same mesh as another object use that mesh and make them instance geometry",
+        default=False
+    )
+
+    bpy.types.WindowManager.furnace_lightmap_budget = FloatProperty(
+        name="Lightmap Budget (Megatexels)",
+        description="Pick the lightmap resolution scale of each material so that the lightmaps of the level fit this many million texels, 0 keeps the usual scales",
+        default=0.0,
+        min=0.0
+    )
     
 def unregister():
-    for c in classes:
+    bpy.types.TOPBAR_MT_file_import.remove(import_menu)
+
+    del bpy.types.WindowManager.furnace_lightmap_budget
+    del bpy.types.WindowManager.furnace_instances
+    del bpy.types.WindowManager.furnace_verify
+    del bpy.types.WindowManager.furnace_profile
+
+    for c in reversed(classes):
         bpy.utils.unregister_class(c)
 
 if __name__ == "__main__": register()
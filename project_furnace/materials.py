@@ -1,12 +1,11 @@
 import bpy
+import numpy
 
+from . import face_layers
+from . import symbols
 
-def transfer_lightmap_properties(material, mesh):
 
-    # do not try to use this outside Edit Mode
-    # geometry that uses the given material should be selected
-
-    if bpy.context.mode != "EDIT_MESH": return
+def transfer_lightmap_properties(material, layers):
 
     # not all materials for Halo need to have lightmap properties
     # do the following only if the power was not set to the default value
@@ -16,51 +15,46 @@ def transfer_lightmap_properties(material, mesh):
         # set up lightmap properties
         # almost everything is available in the face property
 
-        bpy.ops.nwo.face_layer_add(options="emissive")
+        item = layers.add("emissive")
 
-        mesh.face_props[-1].material_lighting_emissive_color_ui = material.color
-        mesh.face_props[-1].material_lighting_emissive_power_ui = material.power
-        mesh.face_props[-1].material_lighting_emissive_quality_ui = material.quality
-        mesh.face_props[-1].material_lighting_emissive_focus_ui = material.emissive_focus
+        item.material_lighting_emissive_color_ui = material.color
+        item.material_lighting_emissive_power_ui = material.power
+        item.material_lighting_emissive_quality_ui = material.quality
+        item.material_lighting_emissive_focus_ui = material.emissive_focus
 
         # attenuation seems to be ignored by Foundry 0.9.3
         # maybe these will be usable in the future
 
         if material.attenuation_enabled:
-           mesh.face_props[-1].material_lighting_attenuation_falloff_ui = material.falloff_distance
-           mesh.face_props[-1].material_lighting_attenuation_cutoff_ui = material.cutoff_distance
+           item.material_lighting_attenuation_falloff_ui = material.falloff_distance
+           item.material_lighting_attenuation_cutoff_ui = material.cutoff_distance
 
         # in materials set up by the Halo Asset Blender Development Toolset
         # this is grouped with the lightmap resolution properties
 
-        mesh.face_props[-1].material_lighting_use_shader_gel_ui = material.use_shader_gel
+        item.material_lighting_use_shader_gel_ui = material.use_shader_gel
 
         # the terminology is different but these two things seem to be similar
         # assume they are equivalent or at least similar enough in their purpose
 
-        mesh.face_props[-1].material_lighting_emissive_per_unit_ui = material.power_per_unit_area
-
+        item.material_lighting_emissive_per_unit_ui = material.power_per_unit_area
 
-def transfer_lightmap_resolution_properties(material, mesh):
 
-    # do not try to use this outside Edit Mode
-    # geometry that uses the given material should be selected
-
-    if bpy.context.mode != "EDIT_MESH": return
+def transfer_lightmap_resolution_properties(material, layers, scale=None):
 
     # the default color of the two-sided transparency tint is black
     # ignore the two-sided transparency tint if the color is not something else
 
     if material.additive_transparency.hsv[2] > 0.000:
-        bpy.ops.nwo.face_layer_add_lightmap(options="lightmap_additive_transparency")
-        mesh.face_props[-1].lightmap_additive_transparency_ui = material.additive_transparency
+        item = layers.add("lightmap_additive_transparency")
+        item.lightmap_additive_transparency_ui = material.additive_transparency
 
     # the default color for additive transparency is black 
     # set up additive transparency only if the color is something else
 
     if material.two_sided_transparent_tint.hsv[2] > 0.000:
-        bpy.ops.nwo.face_layer_add_lightmap(options="lightmap_translucency_tint_color")
-        mesh.face_props[-1].lightmap_translucency_tint_color_ui = material.two_sided_transparent_tint
+        item = layers.add("lightmap_translucency_tint_color")
+        item.lightmap_translucency_tint_color_ui = material.two_sided_transparent_tint
 
     # when setting lightmap resolution scale in the Foundry UI
     # the range of possible values is limited to whole numbers in the range [0, 7]
@@ -71,21 +65,23 @@ def transfer_lightmap_resolution_properties(material, mesh):
     # the default value Foundry uses for lightmap resolution scale seems to be 3
     # the default value used by the Halo Asset Blender Development Toolset seems to be 1
 
+    # a scale worked out for a lightmap budget takes the place of the thresholds below
+
+    if scale is not None:
+        item = layers.add("lightmap_resolution_scale")
+        item.lightmap_resolution_scale_ui = scale
+        return
+
     if material.lightmap_res < 1.00:
-        bpy.ops.nwo.face_layer_add_lightmap(options="lightmap_resolution_scale")
-        mesh.face_props[-1].lightmap_resolution_scale_ui = 1
+        item = layers.add("lightmap_resolution_scale")
+        item.lightmap_resolution_scale_ui = 1
 
     if material.lightmap_res > 1.00:
-        bpy.ops.nwo.face_layer_add_lightmap(options="lightmap_resolution_scale")
-        mesh.face_props[-1].lightmap_resolution_scale_ui = 5
+        item = layers.add("lightmap_resolution_scale")
+        item.lightmap_resolution_scale_ui = 5
 
 
-def transfer_material_flags(material):
-
-    # do not try to use this outside Edit Mode
-    # geometry that uses the given material should be selected
-
-    if bpy.context.mode != "EDIT_MESH": return
+def transfer_material_flags(material, layers):
 
     # for the various flags that can be set for the material
     # set up a face property if the flag is enabled
@@ -95,45 +91,45 @@ def transfer_material_flags(material):
     # some of them are for special types of objects
 
     if material.two_sided:
-        bpy.ops.nwo.face_layer_add(options="two_sided")
+        layers.add("two_sided")
 
     if material.transparent_1_sided:
-        bpy.ops.nwo.face_layer_add(options="transparent")
+        layers.add("transparent")
 
     if material.transparent_2_sided:
-        bpy.ops.nwo.face_layer_add(options="two_sided")
-        bpy.ops.nwo.face_prop_add(options="transparent")
+        layers.add("two_sided")
+        layers.extend("transparent")
 
     if material.render_only:
-        bpy.ops.nwo.face_layer_add(options="render_only")
+        layers.add("render_only")
 
     if material.collision_only:
-        bpy.ops.nwo.face_layer_add(options="collision_only")
+        layers.add("collision_only")
 
     if material.sphere_collision_only:
-        bpy.ops.nwo.face_layer_add(options="sphere_collision_only")
+        layers.add("sphere_collision_only")
 
     # if material.fog_plane:
 
     if material.ladder:
-        bpy.ops.nwo.face_layer_add(options="ladder")
+        layers.add("ladder")
 
     if material.breakable:
-        bpy.ops.nwo.face_layer_add(options="breakable")
+        layers.add("breakable")
 
     # if material.ai_deafening:
 
     if material.no_shadow:
-        bpy.ops.nwo.face_layer_add(options="no_shadow")
+        layers.add("no_shadow")
 
     if material.shadow_only:
-        bpy.ops.nwo.face_layer_add(options="shadow_only")
+        layers.add("shadow_only")
 
     # if material.lightmap_only:
-    #     bpy.ops.nwo.face_layer_add(options="lightmap_only")
+    #     layers.add("lightmap_only")
 
     if material.precise:
-        bpy.ops.nwo.face_layer_add(options="precise_position")
+        layers.add("precise_position")
 
     # if material.conveyor:
     # if material.portal_1_way:
@@ -144,156 +140,233 @@ def transfer_material_flags(material):
     # if material.blocks_sound:
 
     if material.decal_offset:
-        bpy.ops.nwo.face_layer_add(options="decal_offset")
+        layers.add("decal_offset")
 
     # if material.water_surface:
 
     if material.slip_surface:
-        bpy.ops.nwo.face_layer_add(options="slip_surface")
+        layers.add("slip_surface")
 
     # if material.group_transparents_by_plane:
 
 
-def parse_material_name(name, material):
+def set_material_flags(flags, material):
+
+    # enable the given flags of the material
+    # only write the flags that are not already enabled
+
+    for flag in flags:
+        if not getattr(material, flag): setattr(material, flag, True)
+
+
+class ParsedFlags:
+
+    # the flags of a material as they will be once the name has been parsed
+    # without actually enabling anything on the material yet
+
+    def __init__(self, material, flags):
+        self.material = material
+        self.flags = frozenset(flags)
+
+    def __getattr__(self, name):
+
+        if name in self.flags: return True
+
+        return getattr(self.material, name)
+
+
+def parsed_flags(material):
 
     # check the name of the material for any special symbols
-    # enable the corresponding flag for the material
-
-    for c in name: 
-
-        # special symbols should be placed before or after the actual name
-        # do not continue if this character is a letter or a number
-
-        if c.isalnum(): return
-
-        # many of these can be used for almost anything within a level
-        # some of them are intended only for special types of geometry
-
-        match c:
-
-            case "%": 
-                material.two_sided = True
-                
-            case "#": 
-                material.transparent_1_sided = True
-                
-            case "?": 
-                material.transparent_2_sided = True
-                
-            case "!": 
-                material.render_only = True
-                
-            case "@": 
-                material.collision_only = True
-                
-            case "*": 
-                material.sphere_collision_only = True
-                
-            case "$": 
-                material.fog_plane = True
-                
-            case "^": 
-                material.ladder = True
-                
-            case "-": 
-                material.breakable = True
-                
-            case "&": 
-                material.ai_deafening = True
-                
-            case "=": 
-                material.no_shadow = True
-                
-            case ".": 
-                material.shadow_only = True
-                
-            case ";": 
-                material.lightmap_only = True
-                
-            case ")": 
-                material.precise = True
-                
-            case ">": 
-                material.conveyor = True
-                
-            case "<": 
-                material.portal_1_way = True
-                
-            case "|": 
-                material.portal_door = True
-                
-            case "~": 
-                material.portal_vis_blocker = True
-                
-            case "(": 
-                material.dislike_photons = True
-                
-            case "{": 
-                material.ignored_by_lightmaps = True
-                
-            case "}": 
-                material.blocks_sound = True
-                
-            case "[": 
-                material.decal_offset = True
-                
-            case "'": 
-                material.water_surface = True
-                
-            case "0": 
-                material.slip_surface = True
-                
-            case "]": 
-                material.group_transparents_by_plane = True
-
-
-def add_seam_sealer(mesh):
-    
-    # do not try to use this outside Edit Mode
-    # geometry that uses the given material should be selected
+    # list the flags that should be enabled according to those symbols
 
-    if bpy.context.mode != "EDIT_MESH": return
+    return symbols.material_flags(symbols.parse_material_name(material.name))
 
+
+def add_seam_sealer(layers):
+    
     # levels in Halo should not have gaps or holes in its geometry
     # this material is for geometry that seals up those openings
 
-    bpy.ops.nwo.face_layer_add(options="_connected_geometry_face_type_seam_sealer")
+    layers.add("_connected_geometry_face_type_seam_sealer")
 
 
-def add_sky(material, mesh):
-
-    # do not try to use this outside Edit Mode
-    # some geometry should be already selected
-
-    if bpy.context.mode != "EDIT_MESH": return
+def add_sky(material, layers):
 
     # the sky is usually not part of the level
     # geometry that uses this special material will be invisible
     # this allows the sky to be seen through those parts of the level
 
-    bpy.ops.nwo.face_layer_add(options="_connected_geometry_face_type_sky")
+    item = layers.add("_connected_geometry_face_type_sky")
 
     # levels in Halo can reference and use more than one sky
+
+    index = sky_index(material.name)
+
+    if index is None: return
+
+    item.sky_permutation_index_ui = index
+
+
+def sky_index(name):
+
     # materials used to show the sky should have a number at the end of the name
     # that number corresponds to the index of a sky referenced by the level
 
-    index = material.name.split("+sky")[1]
+    index = name.split("+sky")[1]
     index = index.split(".")[0]
 
-    if len(index.strip()) <= 0: return
+    if len(index.strip()) <= 0: return None
 
     for c in index:
-        if c not in "1234567890": return
+        if c not in "1234567890": return None
+
+    return int(index)
+
+
+def is_halo(material):
+
+    # nothing needs to be done if
+    # the material slot has no material
+    # the material is not a material for Halo
+
+    if not material: return False
+    if not material.get("ass_jms"): return False
+
+    return True
+
+
+def transfer_material(material, layers, flags=None, scale=None):
+
+    # the flags to use might differ from the flags currently set for the material
+
+    if flags is None: flags = material.ass_jms
+
+    # some materials are for specific and special uses
+    # such materials need to be processed in a different way
+
+    if material.name.startswith("+sky"):
+        add_sky(material, layers)
+        return
+
+    if material.name.startswith("+seamsealer"):
+        add_seam_sealer(layers)
+        return
+
+    # add and modify face properties according to the material
+
+    transfer_material_flags(flags, layers)
+    transfer_lightmap_resolution_properties(flags, layers, scale)
+    transfer_lightmap_properties(flags, layers)
 
-    mesh.face_props[-1].sky_permutation_index_ui = int(index)
 
+def face_flags(obj, layers):
 
-def set_face_properties(obj):
+    # give each different face layer used by the mesh a bit
+    # and work out the bitmask of every face from its material in one go
+
+    table = numpy.zeros(max(len(obj.material_slots), 1), dtype=numpy.int64)
+
+    keys = {}
+    used = []
+
+    for index, slot in enumerate(obj.material_slots):
+
+        if not slot.material: continue
+
+        for layer in layers.get(slot.material.name, []):
+
+            key = face_layers.layer_key(layer)
+
+            if key not in keys:
+                keys[key] = len(used)
+                used.append(layer)
+
+            table[index] |= 1 << keys[key]
+
+    # faces with an index past the last slot use the last slot
+
+    indices = numpy.zeros(len(obj.data.polygons), dtype=numpy.int32)
+    obj.data.polygons.foreach_get("material_index", indices)
+
+    indices = numpy.minimum(indices, len(table) - 1)
+
+    return table[indices], used
+
+
+def write_face_flags(mesh, flags):
+
+    # keep the bitmask of each face on the mesh
+
+    attribute = mesh.attributes.get(face_layers.FLAGS)
+
+    if attribute is not None: mesh.attributes.remove(attribute)
+
+    attribute = mesh.attributes.new(face_layers.FLAGS, "INT", "FACE")
+    attribute.data.foreach_set("value", flags.astype(numpy.int32))
+
+
+def set_face_properties(obj, layers):
+
+    # write face properties directly to the mesh
+    # this works in Object Mode and does not need any selection
+
+    # the face properties of each material were worked out beforehand
+    # they are given by the name of the material
+
+    flags, used = face_flags(obj, layers)
+
+    if not used: return
+
+    # too many different face layers to fit in the bitmask
+    # set up the face properties of each material separately instead
+
+    if len(used) > face_layers.BITS:
+        set_face_properties_by_material(obj, layers)
+        return
+
+    write_face_flags(obj.data, flags)
+
+    # add one face layer for each different combination of face layers
+    # faces that do not need any face properties have no bits set
+
+    for value in numpy.unique(flags).tolist():
+
+        if not value: continue
+
+        mask = (flags == value).astype(numpy.int32)
+        layer = face_layers.combine([ layer for bit, layer in enumerate(used) if value >> bit & 1 ])
+
+        face_layers.replay([ layer ], face_layers.DataLayers(obj.data, mask))
+
+
+def set_face_properties_by_material(obj, layers):
+
+    for index, mask in face_layers.face_masks(obj):
+
+        material = obj.material_slots[index].material
+
+        if not material: continue
+        if not layers.get(material.name): continue
+
+        # skip materials that are not used by any face
+
+        if not mask.any(): continue
+
+        face_layers.replay(layers[material.name], face_layers.DataLayers(obj.data, mask))
+
+
+def set_face_properties_in_edit_mode(obj, layers):
+
+    # this uses the Foundry operators instead of writing face properties directly
+    # this is for versions of Foundry where face properties are set up differently
 
     # do not try to use this outside Edit Mode
 
     if bpy.context.mode != "EDIT_MESH": return
 
+    writer = face_layers.OperatorLayers(obj.data)
+
     # set up face properties for each material
 
     for index, slot in enumerate(obj.material_slots):
@@ -302,20 +375,9 @@ def set_face_properties(obj):
         # reset selection before moving on
 
         bpy.ops.mesh.select_all(action="DESELECT")
-        
-        # go to the next slot if
-        # the slot has no material
-        # the material is not a material for Halo
 
         if not slot.material: continue
-        if not slot.material.get("ass_jms"): continue
-
-        # enable any flags that should be enabled
-
-        names = [ slot.material.name, reversed(slot.material.name) ]
-
-        for name in names:
-            parse_material_name(name, slot.material.ass_jms)
+        if not layers.get(slot.material.name): continue
 
         # directly setting the active material seems to be incorrect
         # selecting material in user interface changes the active material index
@@ -324,22 +386,7 @@ def set_face_properties(obj):
         obj.active_material_index = index
         bpy.ops.object.material_slot_select()
 
-        # some materials are for specific and special uses
-        # such materials need to be processed in a different way
-
-        if slot.material.name.startswith("+sky"):
-            add_sky(slot.material, obj.data.nwo)
-            continue
-
-        if slot.material.name.startswith("+seamsealer"):
-            add_seam_sealer(obj.data.nwo)
-            continue
-
-        # add and modify face properties according to the material
-
-        transfer_material_flags(slot.material.ass_jms)
-        transfer_lightmap_resolution_properties(slot.material.ass_jms, obj.data.nwo)
-        transfer_lightmap_properties(slot.material.ass_jms, obj.data.nwo)
+        face_layers.replay(layers[slot.material.name], writer)
 
         # reset selection before moving on
 
@@ -0,0 +1,69 @@
+import bpy
+
+from . import profiling
+
+
+# separating objects and merging materials leaves data that nothing uses anymore
+# that data stays in memory for the rest of the run and ends up in the saved file
+# remove it between stages but leave alone anything that was already unused before the run
+
+KINDS = ( "meshes", "materials", "images" )
+
+
+def orphaned(block):
+    return block.users == 0 and not block.use_fake_user
+
+
+def snapshot():
+
+    # remember what was already unused before the run
+    # the address of a block stays the same for as long as the block exists
+
+    return {
+        kind: set(block.as_pointer() for block in getattr(bpy.data, kind) if orphaned(block))
+        for kind in KINDS
+    }
+
+
+class Collector:
+
+    def __init__(self):
+
+        self.before = snapshot()
+
+        self.freed = { kind: 0 for kind in KINDS }
+        self.memory = 0
+
+    def collect(self):
+
+        # removing a mesh can leave its materials unused
+        # and removing a material can leave its images unused
+        # so keep going until nothing else can be removed
+
+        start = profiling.memory()
+
+        while True:
+
+            removed = 0
+
+            for kind in KINDS:
+
+                kept = self.before[kind]
+                blocks = [ b for b in getattr(bpy.data, kind) if orphaned(b) and b.as_pointer() not in kept ]
+
+                if not blocks: continue
+
+                bpy.data.batch_remove(blocks)
+
+                self.freed[kind] += len(blocks)
+                removed += len(blocks)
+
+            if not removed: break
+
+        end = profiling.memory()
+
+        if start is not None and end is not None:
+            self.memory += start - end
+
+    def report(self):
+        return { "freed": dict(self.freed), "memory": self.memory }
@@ -0,0 +1,323 @@
+import bpy
+import json
+import numpy
+
+from . import consolidation
+from . import duplicates
+from . import face_layers
+from . import fingerprints
+from . import instance_geometry
+from . import lightmap
+from . import materials
+from . import portals
+from . import roles
+from . import scheduler
+from . import separation
+
+
+# the plan says everything that needs to be done to a level
+# it is made of plain data so that it can be saved as JSON and compared between runs
+# nothing in the scene is changed while the plan is being made
+
+VERSION = 7
+
+ASSET_TYPE = "SCENARIO"
+
+# for levels that are originally from Halo 3 and Halo 3: ODST
+# this is the most appropriate default mesh type
+
+STRUCTURE = "_connected_geometry_mesh_type_structure"
+
+
+def is_valid(obj):
+
+    # if the object is hidden for some reason
+    # the object probably should be ignored
+
+    if obj.hide_get(): return False
+
+    # verify that the object has properties set up and used by Foundry
+    # nothing can be done if those are not there for whatever reason
+
+    try:
+
+        # assume the attribute exists and try to access it to verify its existence
+        # try to continue if doing this leads to an exception
+
+        if not obj.get("nwo") and not obj.nwo: return False
+
+    except:
+
+        print("ERROR: Please go ensure that Foundry is installed")
+        return False
+
+    # ignore objects that seem to be of the wrong type
+
+    if obj.type != "MESH": return False
+
+    # the object meets all the requirements
+
+    return True
+
+
+def is_apart(record):
+
+    # geometry with a material for glass or portals or a material not for Halo
+    # ends up in an object of its own
+
+    return not record.halo or record.two_sided or record.portal
+
+
+def material_name(material):
+    return material.name if material else ""
+
+
+def plan_material(material, scale=None):
+
+    record = roles.material(material)
+
+    entry = {
+        "halo": record.halo,
+        "apart": is_apart(record),
+        "flags": [],
+        "layers": []
+    }
+
+    if not record.halo: return entry
+
+    # the flags to enable according to the special symbols in the name
+
+    flags = materials.parsed_flags(material)
+
+    entry["flags"] = list(flags)
+
+    # record the face properties the material needs
+    # as if the flags in the name were already enabled
+
+    layers = face_layers.RecordedLayers()
+    materials.transfer_material(material, layers, materials.ParsedFlags(material.ass_jms, flags), scale)
+
+    entry["layers"] = layers.layers
+
+    return entry
+
+
+def piece_properties(name, records, instance=False):
+
+    # the object properties of an object
+    # according to its name and the materials it ends up with
+
+    properties = [ ("mesh_type_ui", STRUCTURE) ]
+
+    # set the object properties according to the mesh type
+
+    if any(record.portal for record in records):
+        properties.extend(portals.object_properties(records))
+
+    if instance or instance_geometry.is_instance_name(name):
+        properties.extend(instance_geometry.object_properties(name))
+
+    return [ list(p) for p in properties ]
+
+
+def piece(name, slot_materials, instance=False):
+
+    records = [ roles.material(m) for m in slot_materials ]
+
+    return {
+        "materials": sorted(material_name(m) for m in slot_materials),
+        "properties": piece_properties(name, records, instance)
+    }
+
+
+def plan_object(obj, instance=False, mapping=None):
+
+    # copies of the same material are merged before anything else
+    # everything else is planned as if that had been done already
+
+    merged = consolidation.merged_slots(obj, mapping, bpy.data.materials.get)
+
+    if merged:
+        slot_materials, remap = merged
+        indices = consolidation.merged_indices(obj, remap)
+    else:
+        slot_materials = [ slot.material for slot in obj.material_slots ]
+        indices = separation.material_indices(obj.data)
+
+    # the material slots that no faces use are removed next
+
+    # faces with an index past the last slot use the last slot
+
+    count = len(slot_materials)
+
+    if count:
+        indices = numpy.minimum(indices, count - 1)
+        used = numpy.bincount(indices, minlength=count) > 0
+    else:
+        used = numpy.zeros(0, dtype=bool)
+
+    used_materials = [ slot_materials[i] for i in numpy.flatnonzero(used).tolist() ]
+    records = [ roles.material(m) for m in used_materials ]
+
+    # unused slots are removed from the mesh
+
+    entry = {
+        "name": obj.name,
+        "merge": merged is not None,
+        "prune": len(used_materials) < count,
+        "split": False,
+        "pieces": []
+    }
+
+    # separate any geometry intended to be glass or for setting up portals
+    # two-sided geometry and portals for levels should be separate
+
+    if len(used_materials) >= 2 and any(r.two_sided or r.portal for r in records):
+
+        apart = numpy.array([ is_apart(roles.material(m)) for m in slot_materials ])
+        groups = numpy.where(apart[indices], indices, -1)
+
+        keys = separation.split_order(groups)
+        rest = sorted(set(numpy.unique(indices[groups < 0]).tolist()))
+
+        entry["split"] = separation.splits(keys, len(rest))
+
+    if not entry["split"]:
+        entry["pieces"].append(piece(obj.name, used_materials, instance))
+        return entry
+
+    # everything that stays together ends up in one object
+    # everything else ends up in an object for each material
+
+    if rest:
+        entry["pieces"].append(piece(obj.name, [ slot_materials[i] for i in rest ], instance))
+
+    for key in keys:
+        entry["pieces"].append(piece(obj.name, [ slot_materials[key] ], instance))
+
+    return entry
+
+
+def planning(scene=None, force=False, instances=False, budget=None):
+
+    # read the scene once and work out what needs to be done
+    # objects that have not changed since the last run are left out
+    # unless everything should be done again anyway
+
+    # with a lightmap budget in texels the lightmap resolution scale of each material
+    # is picked so that the lightmaps of the whole level fit the budget
+
+    # this yields after each object so that the work can be paused in between
+    # the plan is returned at the end
+
+    if scene is None: scene = bpy.data.scenes["Scene"]
+
+    roles.build()
+
+    objects = [ obj for obj in bpy.data.objects if is_valid(obj) ]
+
+    used = set()
+
+    for obj in objects:
+        used.update(slot.material for slot in obj.material_slots if slot.material)
+
+    # copies of the same material made by the importer
+    # each is replaced by the material it is a copy of
+
+    mapping = consolidation.find(used, objects)
+
+    # the whole level is measured even if only some objects changed
+    # the scales depend on every material in the level
+
+    report = (yield from lightmap.analyze(objects, budget, mapping)) if budget else None
+    scales = lightmap.material_scales(report) if report else {}
+
+    entries = {}
+    prints = {}
+
+    for m in sorted(used, key=lambda m: m.name):
+        entries[m.name] = plan_material(m, scales.get(mapping.get(m.name, m.name)))
+        prints[m.name] = fingerprints.material_fingerprint(m.name, entries[m.name])
+
+        yield
+
+    # the fingerprint of an object includes the fingerprints of its materials
+    # changing a material makes every object that uses it change as well
+
+    dirty = []
+
+    for obj in objects:
+        if force or fingerprints.changed(obj, fingerprints.object_fingerprint(obj, prints)):
+            dirty.append(obj)
+
+        yield
+
+    # only the materials of the objects that changed are needed
+
+    needed = set()
+
+    for obj in dirty:
+        needed.update(mapping.get(slot.material.name, slot.material.name) for slot in obj.material_slots if slot.material)
+
+    for name in needed:
+        entries[name]["fingerprint"] = prints[name]
+
+    # objects with exactly the same geometry as another object
+    # end up sharing its mesh as instance geometry if asked for
+
+    copies = (yield from duplicates.search(dirty, mapping)) if instances else {}
+    shared = set(copies) | set(copies.values())
+
+    planned = []
+
+    for obj in dirty:
+
+        instance = obj.name in shared or instance_geometry.is_instance(obj)
+
+        entry = plan_object(obj, instance, mapping)
+
+        entry["instance"] = instance
+        entry["duplicate_of"] = copies.get(obj.name)
+
+        planned.append(entry)
+
+        yield
+
+    # whether the mesh of each object changes at all
+    # objects with meshes that do not change can keep sharing them with other objects
+
+    for obj, entry in zip(dirty, planned):
+
+        names = set(mapping.get(slot.material.name, slot.material.name) for slot in obj.material_slots if slot.material)
+        layered = any(entries[name]["layers"] for name in names)
+
+        entry["edits"] = entry["merge"] or entry["prune"] or entry["split"] or layered
+
+    return {
+        "version": VERSION,
+        "scene": scene.name,
+        "asset_type": ASSET_TYPE,
+        "materials": { name: entries[name] for name in sorted(needed) },
+        "merge": mapping,
+        "objects": planned,
+        "skipped": len(objects) - len(dirty),
+        "lightmap": report
+    }
+
+
+def plan(scene=None, force=False, instances=False, budget=None):
+    return scheduler.complete(planning(scene, force, instances, budget))
+
+
+def save(plan, path):
+
+    # keys are sorted so that plans can be compared line by line
+
+    with open(path, "w") as f:
+        json.dump(plan, f, indent=4, sort_keys=True)
+
+
+def load(path):
+
+    with open(path) as f:
+        return json.load(f)
@@ -1,106 +1,7 @@
-import bpy
+def transfer_material_flags(flags):
 
-
-def for_portals(obj):
-
-    # portals in Halo are set up using meshes
-    # abort if the object is not able to have meshes
-
-    if not obj.type == "MESH": return False
-        
-    # if any of the materials has the appropriate prefix
-    # assume the object is intended for setting up portals
-
-    for slot in obj.material_slots:
-
-        # go to the next slot if
-        # the slot has no material
-        # the material is not a material for Halo
-
-        if not slot.material: continue
-        if not slot.material.get("ass_jms"): continue
-
-        # if the name of the material has the appropriate prefix
-        # the object is probably for setting up portals
-
-        if slot.material.name.startswith("+portal"): return True
-
-    return False
-
-
-def separate_selection():
-
-    # do not try to use this outside Edit Mode
-    # geometry that uses the given material should be selected
-
-    if bpy.context.mode != "EDIT_MESH": return
-
-    # try to separate selected geometry
-
-    try: 
-
-        # separate already selected geometry and put that in a new object
-        # the operator raises an exception if nothing was actually selected
-
-        bpy.ops.mesh.separate(type="SELECTED")
-
-    except: 
-
-        # someone out there who worked on this thing for Blender actually thought
-        # raising an exception is both necessary and better than failing gracefully
-
-        print("bruh")
-
-
-def separate_by_material(obj):
-
-    # do not try to use this outside Edit Mode
-
-    if bpy.context.mode != "EDIT_MESH": return
-
-    # if there are less than two materials
-    # there is no need to do anything here
-
-    if len(obj.material_slots) < 2: return
-
-    # reset selection before moving on
-
-    bpy.ops.mesh.select_all(action="DESELECT")
-
-    # select the geometry not intended for setting up portals
-    # separate all that geometry from everything else
-
-    for index, slot in enumerate(obj.material_slots):
-
-        # do not select any geometry by the material if
-        # the slot has no material
-        # the material is not a material meant for Halo
-        # the material is intended for setting up portals
-
-        if not slot.material: continue
-        if not slot.material.get("ass_jms"): continue
-
-        if slot.material.name.startswith("+portal"): continue
-
-        # directly setting the active material seems to be incorrect
-        # selecting material in user interface changes the active material index
-        # setting the index seems to be the correct way to set the active material
-
-        obj.active_material_index = index
-        bpy.ops.object.material_slot_select()
-    
-    separate_selection()
-
-    # reset selection before moving on
-
-    bpy.ops.mesh.select_all(action="DESELECT")
-
-    # separate everything else by material
-
-    bpy.ops.mesh.separate(type="MATERIAL")
-
-
-def transfer_material_flags(material, obj):
+    # transfer flags used for materials in Halo to object properties
+    # most flags do not apply to portals but some of them are for portals
 
     dictionary = {
         "portal_ai_deafening_ui": "ai_deafening",
@@ -108,45 +9,34 @@ def transfer_material_flags(material, obj):
         "portal_is_door_ui": "portal_door"
     }
 
-    if material.portal_1_way:
-        obj.portal_type_ui = "_connected_geometry_portal_type_one_way"
+    properties = []
+
+    if "portal_1_way" in flags:
+        properties.append(("portal_type_ui", "_connected_geometry_portal_type_one_way"))
 
-    if material.portal_vis_blocker:
-        obj.portal_type_ui = "_connected_geometry_portal_type_no_way"
+    if "portal_vis_blocker" in flags:
+        properties.append(("portal_type_ui", "_connected_geometry_portal_type_no_way"))
     
     for p, f in dictionary.items():
-        setattr(obj, p, getattr(material, f))
-
-
-def set_object_properties(obj):
-
-    # directly set object properties that are needed for portals
-    # without interacting with the Foundry UI in the same way that users do
+        properties.append((p, f in flags))
 
-    # there is no reason to have a conditional statement here
-    # but having that somehow allows the mesh type to be reliably updated
+    return properties
 
-    if obj.nwo.mesh_type_ui:
-        obj.nwo.mesh_type_ui = "_connected_geometry_mesh_type_portal"
-        obj.nwo.portal_type_ui = "_connected_geometry_portal_type_two_way"
 
-    # check all material slots
-    # there can be unused material slots
+def object_properties(records):
 
-    for slot in obj.material_slots:
+    # list the object properties that are needed for portals
+    # the properties are set directly without interacting with the Foundry UI
 
-        # skip to the next slot if there is no material in the material slot
+    properties = [
+        ("mesh_type_ui", "_connected_geometry_mesh_type_portal"),
+        ("portal_type_ui", "_connected_geometry_portal_type_two_way")
+    ]
 
-        if not slot.material: continue
-        
-        # skip to the next slot if
-        # the material is not a material for Halo
-        # the material is not for portals in Halo
-        
-        if not slot.material.get("ass_jms"): continue
-        if not slot.material.name.startswith("+portal"): continue
+    # check the records of all the materials of the object
+    # skip the materials that are not for portals in Halo
 
-        # transfer flags used for materials in Halo to object properties
-        # most flags do not apply to portals but some of them are for portals
+    for record in records:
+        if record.portal: properties.extend(transfer_material_flags(record.flags))
 
-        transfer_material_flags(slot.material.ass_jms, obj.nwo)
+    return properties
@@ -0,0 +1,339 @@
+import argparse
+import json
+import os
+import sys
+
+from collections import namedtuple
+
+from . import blendfile
+from . import instance_geometry
+from . import scheduler
+from . import symbols
+
+
+# find out how heavy a level is before converting it
+# this runs outside Blender with a regular Python interpreter
+
+#   python -m project_furnace.preflight LEVELS [--json]
+
+# only the objects, meshes and materials are read from the file
+# the rest of the file is skipped without being loaded
+
+OB_MESH = 1
+
+# the roles a material can have according to its name
+
+PORTAL = symbols.PORTAL
+SKY = symbols.SKY
+SEAM_SEALER = symbols.SEAM_SEALER
+TWO_SIDED = symbols.TWO_SIDED
+
+APART = ( PORTAL, SKY, SEAM_SEALER, TWO_SIDED )
+
+# the work done before the first stage
+# looking up every material, finding duplicates and merging materials
+
+PREPARE = "prepare"
+
+# rough seconds spent on each object, material slot and face during each stage
+# only the ratio between levels matters when balancing work between workers
+# the numbers can be brought closer to a given machine with the profiles written by --profile
+
+Cost = namedtuple("Cost", [ "object", "slot", "face" ])
+
+COSTS = {
+    PREPARE: Cost(0.0005, 0.0001, 0.000002),
+    scheduler.PRUNE: Cost(0.002, 0.0005, 0.0),
+    scheduler.SEPARATE: Cost(0.03, 0.01, 0.00001),
+    scheduler.CLEAN_UP: Cost(0.002, 0.0, 0.0),
+    scheduler.FACE_PROPERTIES: Cost(0.004, 0.002, 0.000004),
+    scheduler.OBJECT_PROPERTIES: Cost(0.001, 0.0, 0.0)
+}
+
+
+def material_roles(name):
+
+    # the flags include those enabled by the special symbols in the name
+    # flags enabled on the material itself are not known without Blender
+
+    flags = symbols.material_flags(symbols.parse_material_name(name))
+
+    return symbols.material_roles(name, flags), list(flags)
+
+
+def read_blocks(path, fmt, dna):
+
+    # go through the file again now that the layout of each structure is known
+    # the material slots of a mesh or an object are saved in a block right after it
+
+    objects = []
+    meshes = {}
+    materials = {}
+
+    wanted = {}
+
+    with blendfile.open_file(path) as f:
+
+        blendfile.read_format(f)
+
+        for code, block, data in blendfile.blocks(f, fmt):
+
+            kind = dna.structs[block.sdna] if 0 <= block.sdna < len(dna.structs) else None
+
+            if code == b"OB" and kind == "Object":
+
+                content = data()
+
+                obj = {
+                    "name": dna.read(content, kind, "id.name", "")[2:],
+                    "type": dna.read(content, kind, "type", 0),
+                    "data": dna.read(content, kind, "data", 0),
+                    "slots": dna.read(content, kind, "totcol", 0),
+                    "materials": []
+                }
+
+                objects.append(obj)
+
+                pointer = dna.read(content, kind, "mat", 0)
+
+                if pointer: wanted[pointer] = obj
+
+            elif code == b"ME" and kind == "Mesh":
+
+                content = data()
+
+                mesh = {
+                    "vertices": dna.first(content, kind, ( "totvert", "verts_num" ), 0),
+                    "faces": dna.first(content, kind, ( "totpoly", "faces_num", "totface" ), 0),
+                    "loops": dna.first(content, kind, ( "totloop", "corners_num" ), 0),
+                    "slots": dna.read(content, kind, "totcol", 0),
+                    "materials": []
+                }
+
+                meshes[block.address] = mesh
+
+                pointer = dna.read(content, kind, "mat", 0)
+
+                if pointer: wanted[pointer] = mesh
+
+            elif code == b"MA" and kind == "Material":
+
+                materials[block.address] = dna.read(data(), kind, "id.name", "")[2:]
+
+            elif code == b"DATA" and block.address in wanted:
+
+                wanted.pop(block.address)["materials"] = list(dna.pointers(data()))
+
+    return objects, meshes, materials
+
+
+def slot_names(obj, mesh, materials):
+
+    # materials linked to the object take the place of those of the mesh
+
+    names = []
+
+    for i in range(max(obj["slots"], mesh["slots"])):
+
+        pointer = obj["materials"][i] if i < len(obj["materials"]) else 0
+
+        if not pointer and i < len(mesh["materials"]): pointer = mesh["materials"][i]
+
+        names.append(materials.get(pointer, ""))
+
+    return names
+
+
+def estimate(objects, materials):
+
+    # the cost of each stage according to the objects that go through it
+    # objects with materials that are kept apart are separated into one object per material
+
+    roles = { name: set(entry["roles"]) for name, entry in materials.items() }
+
+    totals = { stage: Cost(0, 0, 0) for stage in COSTS }
+
+    def add(stage, count, slots, faces):
+        totals[stage] = Cost(totals[stage].object + count, totals[stage].slot + slots, totals[stage].face + faces)
+
+    for obj in objects:
+
+        slots = obj["slots"]
+        faces = obj["faces"] or 0
+
+        apart = [ name for name in slots if roles.get(name, set()) & set(APART) ] if slots is not None else []
+
+        count = len(slots) if slots is not None else 1
+
+        add(PREPARE, 1, count, faces)
+        add(scheduler.PRUNE, 1, count, 0)
+
+        # the pieces are the materials kept apart and everything else together
+
+        pieces = len(apart) + (1 if len(apart) < count else 0)
+
+        if apart and count > 1:
+            add(scheduler.SEPARATE, 1, pieces, faces)
+            add(scheduler.CLEAN_UP, pieces, 0, 0)
+        else:
+            pieces = 1
+
+        add(scheduler.FACE_PROPERTIES, pieces, count, faces)
+        add(scheduler.OBJECT_PROPERTIES, pieces, 0, 0)
+
+    add(PREPARE, 0, len(materials), 0)
+
+    return {
+        stage: round(COSTS[stage].object * t.object + COSTS[stage].slot * t.slot + COSTS[stage].face * t.face, 3)
+        for stage, t in totals.items()
+    }
+
+
+def scan_names(path):
+
+    # only the names can be found through Blender without loading anything
+    # nothing is loaded as long as nothing is asked for inside the block
+
+    import bpy
+
+    with bpy.data.libraries.load(path) as (data_from, data_to):
+        names = list(data_from.objects), list(data_from.materials)
+
+    return [ { "name": n, "slots": None, "faces": None } for n in names[0] ], names[1]
+
+
+def scan(path):
+
+    # list the objects and materials of the file
+    # along with an estimate of the time each stage of a run would take
+
+    summary = { "file": path, "size": os.path.getsize(path) }
+
+    try:
+
+        fmt, dna = blendfile.read_dna(path)
+        objects, meshes, pointers = read_blocks(path, fmt, dna)
+
+        summary["version"] = fmt.version
+
+        entries = []
+
+        for obj in objects:
+
+            if obj["type"] != OB_MESH or obj["data"] not in meshes: continue
+
+            mesh = meshes[obj["data"]]
+
+            entries.append({
+                "name": obj["name"],
+                "instance": instance_geometry.is_instance_name(obj["name"]),
+                "slots": slot_names(obj, mesh, pointers),
+                "faces": mesh["faces"]
+            })
+
+        names = list(pointers.values())
+
+    except blendfile.UnsupportedFile:
+
+        # compressed files can still be looked at from inside Blender
+        # though only the names are known that way
+
+        if "bpy" not in sys.modules: raise
+
+        entries, names = scan_names(path)
+
+        for entry in entries:
+            entry["instance"] = instance_geometry.is_instance_name(entry["name"])
+
+    materials = {}
+
+    for name in names:
+        roles, flags = material_roles(name)
+        materials[name] = { "roles": roles, "flags": flags }
+
+    summary["objects"] = entries
+    summary["materials"] = materials
+
+    summary["counts"] = {
+        "objects": len(entries),
+        "instances": sum(1 for e in entries if e["instance"]),
+        "materials": len(materials),
+        "slots": sum(len(e["slots"]) for e in entries if e["slots"] is not None),
+        "faces": sum(e["faces"] for e in entries if e["faces"] is not None)
+    }
+
+    summary["estimates"] = estimate(entries, materials)
+    summary["estimate"] = round(sum(summary["estimates"].values()), 3)
+
+    return summary
+
+
+def cost(path):
+
+    # the estimated time of a whole run
+    # files that cannot be read are given no estimate
+
+    try: return scan(path)["estimate"]
+    except (OSError, ImportError, blendfile.UnsupportedFile): return None
+
+
+def report(summary):
+
+    counts = summary["counts"]
+
+    print("%s: %d objects (%d instances), %d materials, %d slots, %d faces" % (
+        os.path.basename(summary["file"]),
+        counts["objects"],
+        counts["instances"],
+        counts["materials"],
+        counts["slots"],
+        counts["faces"]
+    ))
+
+    for stage, seconds in summary["estimates"].items():
+        print("    %-20s %8.2f s" % (stage, seconds))
+
+    print("    %-20s %8.2f s" % ("total", summary["estimate"]))
+
+
+def arguments(argv=None):
+
+    parser = argparse.ArgumentParser(
+        prog="python -m project_furnace.preflight",
+        description="Estimate how long converting each H3 level would take without opening it in Blender"
+    )
+
+    parser.add_argument("inputs", nargs="+", help=".blend files or directories with .blend files")
+    parser.add_argument("--json", action="store_true", help="print everything found as JSON")
+
+    return parser.parse_args(argv)
+
+
+def main(argv=None):
+
+    from . import batch
+
+    args = arguments(argv)
+    files = batch.find_files(args.inputs)
+
+    if not files:
+        print("No .blend files found")
+        return 1
+
+    summaries = []
+
+    for path in files:
+
+        try: summaries.append(scan(path))
+        except (OSError, ImportError, blendfile.UnsupportedFile) as e:
+            print("%s: %s" % (os.path.basename(path), e), file=sys.stderr)
+
+    if args.json: print(json.dumps(summaries, indent=4))
+    else:
+        for summary in summaries:
+            report(summary)
+
+    return 0 if len(summaries) == len(files) else 1
+
+
+if __name__ == "__main__": sys.exit(main())
@@ -0,0 +1,229 @@
+import json
+import os
+import sys
+import time
+
+from collections import Counter, defaultdict
+from contextlib import contextmanager, nullcontext
+
+import bpy
+
+try: import resource
+except ImportError: resource = None
+
+
+# measure where the time goes during a run
+# nothing is measured unless a profiler has been started
+# when nothing is measured every call here returns right away
+
+profiler = None
+
+# the results of the last run that was measured
+# shown in the sidebar after the run
+
+last = None
+
+# the number of objects listed as the slowest
+
+SLOWEST = 10
+
+NOTHING = nullcontext()
+
+
+def peak_memory():
+
+    # the most memory the process has used so far in bytes
+    # Linux gives the number in kilobytes and macOS gives it in bytes
+
+    if resource is None: return None
+
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+
+    return peak if sys.platform == "darwin" else peak * 1024
+
+
+def memory():
+
+    # the memory the process is using right now in bytes
+    # this is only known on Linux
+
+    try:
+        with open("/proc/self/statm") as f:
+            return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE")
+    except (OSError, ValueError, AttributeError):
+        return None
+
+
+def operator_class():
+
+    # the class Blender uses for every operator called through bpy.ops
+
+    return type(bpy.ops.object.mode_set)
+
+
+def operator_name(op):
+
+    try: return op.idname_py()
+    except AttributeError: return repr(op)
+
+
+class Profiler:
+
+    def __init__(self):
+
+        self.phases = defaultdict(float)
+        self.objects = defaultdict(float)
+
+        self.operators = Counter()
+        self.object_operators = defaultdict(Counter)
+
+        # the object being worked on when an operator is called
+
+        self.current = None
+
+        self.start = None
+        self.total = 0.0
+
+        self.memory = {}
+
+    def install(self):
+
+        # count every operator called through bpy.ops
+        # the original call is put back once the run is over
+
+        cls = operator_class()
+        call = cls.__call__
+
+        profiler = self
+
+        def counted(op, *args, **kwargs):
+
+            name = operator_name(op)
+
+            profiler.operators[name] += 1
+
+            if profiler.current is not None:
+                profiler.object_operators[profiler.current][name] += 1
+
+            return call(op, *args, **kwargs)
+
+        cls.__call__ = counted
+
+        self.restore = lambda: setattr(cls, "__call__", call)
+
+    def begin(self):
+
+        self.memory["before"] = memory()
+        self.memory["peak_before"] = peak_memory()
+
+        self.install()
+        self.start = time.perf_counter()
+
+    def end(self):
+
+        self.total = time.perf_counter() - self.start
+        self.restore()
+
+        self.memory["after"] = memory()
+        self.memory["peak_after"] = peak_memory()
+
+    def report(self):
+
+        slowest = sorted(self.objects.items(), key=lambda item: item[1], reverse=True)[:SLOWEST]
+
+        return {
+            "total": self.total,
+            "memory": dict(self.memory),
+            "phases": dict(self.phases),
+            "operators": dict(self.operators.most_common()),
+            "slowest": [
+                {
+                    "object": name,
+                    "time": seconds,
+                    "operators": dict(self.object_operators[name])
+                }
+                for name, seconds in slowest
+            ]
+        }
+
+
+@contextmanager
+def measure_phase(name):
+
+    start = time.perf_counter()
+
+    try: yield
+    finally: profiler.phases[name] += time.perf_counter() - start
+
+
+@contextmanager
+def measure_object(obj):
+
+    # the name is read now because the object might be removed or renamed
+
+    name = obj.name
+
+    profiler.current = name
+    start = time.perf_counter()
+
+    try: yield
+    finally:
+        profiler.objects[name] += time.perf_counter() - start
+        profiler.current = None
+
+
+def phase(name):
+
+    if profiler is None: return NOTHING
+
+    return measure_phase(name)
+
+
+def per_object(obj):
+
+    if profiler is None: return NOTHING
+
+    return measure_object(obj)
+
+
+def start(enabled=True):
+
+    # start measuring if profiling is enabled
+    # for runs that are spread over many calls like the modal operator
+
+    global profiler
+
+    if not enabled: return None
+
+    profiler = Profiler()
+    profiler.begin()
+
+    return profiler
+
+
+def stop():
+
+    # the results are kept in last once measuring is done
+
+    global profiler, last
+
+    if profiler is None: return
+
+    profiler.end()
+    last = profiler.report()
+    profiler = None
+
+
+@contextmanager
+def run(enabled=True):
+
+    # measure everything done in the block if profiling is enabled
+
+    try: yield start(enabled)
+    finally: stop()
+
+
+def save(report, path):
+
+    with open(path, "w") as f:
+        json.dump(report, f, indent=4)
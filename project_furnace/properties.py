@@ -0,0 +1,102 @@
+import bpy
+
+from . import face_layers
+
+
+# write the object properties used by Foundry for many objects at once
+# the values for every object are collected first and written one property at a time
+
+# Foundry runs its own update functions whenever a property is written
+# those cannot be called on their own so every write still goes through Foundry
+# values that are already set are not written again
+# and the scene is only updated once after everything has been written
+
+# a value can be slightly off once it has been written to a float property
+
+TOLERANCE = 1e-5
+
+
+def same(a, b):
+
+    if isinstance(a, float) or isinstance(b, float):
+        return isinstance(a, (int, float)) and isinstance(b, (int, float)) and abs(a - b) <= TOLERANCE
+
+    if isinstance(a, list) or isinstance(b, list):
+        return isinstance(a, list) and isinstance(b, list) and len(a) == len(b) and all(same(x, y) for x, y in zip(a, b))
+
+    return a == b
+
+
+class PropertyWriter:
+
+    def __init__(self):
+
+        # the value each object should end up with for each property
+        # properties are written in the order they were first seen
+        # so that the mesh type is always written before the properties that depend on it
+
+        self.values = {}
+
+        self.written = 0
+        self.unchanged = 0
+
+        self.mismatches = []
+
+    def add(self, obj, properties):
+
+        # a property given more than once for the same object takes the last value
+
+        for p, v in properties:
+            self.values.setdefault(p, {})[obj] = face_layers.plain(v)
+
+    def __len__(self):
+        return sum(len(objects) for objects in self.values.values())
+
+    def write(self):
+
+        # reading the mesh type first makes sure Foundry has set up the properties of the object
+        # without that the mesh type is sometimes not updated
+
+        objects = set(obj for values in self.values.values() for obj in values)
+
+        for obj in objects:
+            obj.nwo.mesh_type_ui
+
+        for p, values in self.values.items():
+
+            for obj, v in values.items():
+
+                nwo = obj.nwo
+
+                if same(face_layers.plain(getattr(nwo, p)), v):
+                    self.unchanged += 1
+                    continue
+
+                setattr(nwo, p, v)
+                self.written += 1
+
+        if objects: bpy.context.view_layer.update()
+
+    def verify(self):
+
+        # read every value back and report the ones that did not stick
+        # Foundry can change a value again while updating another property
+
+        self.mismatches = []
+
+        for p, values in self.values.items():
+
+            for obj, v in values.items():
+
+                actual = face_layers.plain(getattr(obj.nwo, p))
+
+                if not same(actual, v):
+                    self.mismatches.append({ "object": obj.name, "property": p, "expected": v, "actual": actual })
+
+        for mismatch in self.mismatches:
+            print("WARNING: %(property)s of %(object)s is %(actual)r instead of %(expected)r" % mismatch)
+
+        return self.mismatches
+
+    def clear(self):
+        self.values = {}
@@ -0,0 +1,146 @@
+import bpy
+
+from collections import namedtuple
+
+from . import materials
+from . import symbols
+
+
+# everything worth knowing about a material is worked out once
+# and kept in a record that can be looked up for every slot that uses it
+
+Role = namedtuple("Role", [
+    "halo",
+    "two_sided",
+    "portal",
+    "sky",
+    "sky_index",
+    "seam_sealer",
+    "flags"
+])
+
+NONE = Role(False, False, False, False, None, False, frozenset())
+
+# the flags that can be enabled for a material for Halo
+
+FLAGS = tuple(flag for c, flag in symbols.MATERIAL_SYMBOLS)
+
+# the names used for the roles of a material
+# materials for Halo without any special role are simply for Halo
+
+HALO = "halo"
+TWO_SIDED = symbols.TWO_SIDED
+PORTAL = symbols.PORTAL
+SKY = symbols.SKY
+SEAM_SEALER = symbols.SEAM_SEALER
+
+
+def material_role(material):
+
+    # materials that are not for Halo do not have any role
+
+    if not materials.is_halo(material): return NONE
+
+    # the flags include those enabled by the special symbols in the name
+    # whether or not they have been enabled on the material yet
+
+    name = material.name
+    flags = materials.ParsedFlags(material.ass_jms, materials.parsed_flags(material))
+    enabled = frozenset(f for f in FLAGS if getattr(flags, f))
+
+    found = symbols.material_roles(name, enabled)
+    sky = SKY in found
+
+    return Role(
+        halo=True,
+        two_sided=TWO_SIDED in found,
+        portal=PORTAL in found,
+        sky=sky,
+        sky_index=materials.sky_index(name) if sky else None,
+        seam_sealer=SEAM_SEALER in found,
+        flags=enabled
+    )
+
+
+class RoleIndex:
+
+    # the records are kept for each material and for each mesh
+    # anything not seen before is looked up once and then remembered
+
+    # objects with materials linked to the object rather than the mesh
+    # can have different materials than other objects with the same mesh
+    # their records are kept for the object instead
+
+    def __init__(self):
+        self.materials = {}
+        self.meshes = {}
+
+    def material(self, material):
+
+        if material is None: return NONE
+
+        record = self.materials.get(material)
+
+        if record is None:
+            record = self.materials[material] = material_role(material)
+
+        return record
+
+    def slots(self, obj):
+
+        slots = obj.material_slots
+        key = obj if any(slot.link == "OBJECT" for slot in slots) else obj.data
+
+        records = self.meshes.get(key)
+
+        if records is None:
+            records = self.meshes[key] = tuple(self.material(slot.material) for slot in slots)
+
+        return records
+
+    def forget(self, obj=None):
+
+        # the material slots of an object might have changed
+        # look them up again the next time they are needed
+
+        if obj is None: self.meshes.clear()
+        else:
+            self.meshes.pop(obj.data, None)
+            self.meshes.pop(obj, None)
+
+
+# the index used during a run of FURNACE
+# the index should be built again before each run
+# materials might have been changed or renamed in between
+
+index = RoleIndex()
+
+
+def build():
+
+    global index
+
+    # look up every material in the file once at the start of a run
+
+    index = RoleIndex()
+
+    for material in bpy.data.materials:
+        index.material(material)
+
+    return index
+
+
+def material(material):
+    return index.material(material)
+
+
+def slots(obj):
+    return index.slots(obj)
+
+
+def forget(obj=None):
+    index.forget(obj)
+
+
+def is_halo(material):
+    return index.material(material).halo
@@ -0,0 +1,95 @@
+from collections import deque
+
+
+# the stages of a run of FURNACE in the order they run
+# each object is processed once by each stage
+
+PRUNE = "prune"
+SEPARATE = "separate"
+CLEAN_UP = "clean up"
+FACE_PROPERTIES = "face properties"
+OBJECT_PROPERTIES = "object properties"
+
+STAGES = ( PRUNE, SEPARATE, CLEAN_UP, FACE_PROPERTIES, OBJECT_PROPERTIES )
+
+
+class WorkQueue:
+
+    # the objects in the scene at the start of a run go through every stage
+    # objects created by a stage only go through the stages after it
+    # that way nothing depends on the order of the objects in the file
+
+    def __init__(self, objects, stages=STAGES):
+
+        self.stages = tuple(stages)
+
+        self.queues = { stage: deque(objects) for stage in self.stages }
+        self.done = { stage: set() for stage in self.stages }
+
+        # remember which stage created each object
+        # objects that were there from the start were not created by any stage
+
+        self.created = {}
+
+    def push(self, obj, stage):
+
+        # the object was created while running the given stage
+
+        self.created[obj] = stage
+
+        for later in self.stages[self.stages.index(stage) + 1:]:
+            self.queues[later].append(obj)
+
+    def extend(self, objects, stage):
+
+        for obj in objects:
+            self.push(obj, stage)
+
+    def run(self, stage):
+
+        # go through the objects waiting for the given stage one by one
+        # objects pushed while this runs are picked up if they belong to this stage
+
+        queue = self.queues[stage]
+        done = self.done[stage]
+
+        while queue:
+
+            obj = queue.popleft()
+
+            if obj in done: continue
+
+            done.add(obj)
+
+            yield obj
+
+    def drain(self, stage):
+
+        # take all the objects waiting for the given stage at once
+        # for stages that work on many objects together
+
+        return list(self.run(stage))
+
+    def pending(self, stage):
+        return len(self.queues[stage])
+
+    def progress(self):
+
+        # the share of the work done so far from 0 to 1
+        # objects created along the way make the total grow
+
+        done = sum(len(d) for d in self.done.values())
+        total = done + sum(len(q) for q in self.queues.values())
+
+        return done / total if total else 1.0
+
+
+def complete(steps):
+
+    # do all the work of a generator that yields after each piece
+    # without pausing and give back what it returns at the end
+
+    while True:
+
+        try: next(steps)
+        except StopIteration as done: return done.value
@@ -0,0 +1,235 @@
+import bmesh
+import bpy
+import numpy
+
+from . import roles
+
+
+def material_indices(mesh):
+
+    # read the material index of every face at once
+    # this is much faster than going through the faces one at a time
+
+    indices = numpy.zeros(len(mesh.polygons), dtype=numpy.int32)
+    mesh.polygons.foreach_get("material_index", indices)
+
+    return indices
+
+
+def group_faces(obj, apart):
+
+    # assign each face to a group
+    # the geometry meant to stay together is in the group -1
+    # everything else is grouped by the index of the material slot
+
+    # faces with an index past the last slot use the last slot
+
+    count = len(obj.material_slots)
+    indices = numpy.minimum(material_indices(obj.data), max(count - 1, 0))
+
+    groups = numpy.ones(max(count, 1), dtype=bool)
+
+    for index, slot in enumerate(obj.material_slots):
+        groups[index] = apart(slot.material)
+
+    return numpy.where(groups[indices], indices, -1)
+
+
+def split_order(groups):
+
+    # the groups are handled in the order Blender would handle them
+    # the order is the order in which each material first appears
+
+    keys, first = numpy.unique(groups[groups >= 0], return_index=True)
+
+    return keys[numpy.argsort(first)].tolist()
+
+
+def splits(keys, rest):
+
+    # nothing needs to be separated if all the geometry would end up in a single object
+
+    return len(keys) + (rest > 0) >= 2
+
+
+def buckets(groups):
+
+    # the indices of the faces in each group
+    # the faces are sorted by group once instead of going through them for every group
+
+    order = numpy.argsort(groups, kind="stable")
+    keys, starts = numpy.unique(groups[order], return_index=True)
+
+    return dict(zip(keys.tolist(), numpy.split(order, starts[1:])))
+
+
+def copy_layers(source, bm):
+
+    # a new bmesh has none of the layers of the mesh
+    # geometry copied into it only keeps the layers that are there as well
+    # UV maps, colors, shape keys and other attributes are matched by type and name
+
+    for domain in ("verts", "edges", "faces", "loops"):
+
+        layers = getattr(source, domain).layers
+        target = getattr(bm, domain).layers
+
+        for kind in dir(layers):
+
+            collection = getattr(layers, kind, None)
+
+            if not isinstance(collection, bmesh.types.BMLayerCollection): continue
+
+            existing = getattr(target, kind)
+
+            for name in collection.keys():
+                if existing.get(name) is None: existing.new(name)
+
+
+def copy_faces(source, faces):
+
+    # a bmesh with only the given faces and the edges and vertices they use
+    # only the geometry of the piece is copied rather than the whole mesh
+
+    bm = bmesh.new()
+    copy_layers(source, bm)
+
+    bmesh.ops.duplicate(source, geom=faces, dest=bm)
+
+    return bm
+
+
+def delete_faces(bm, indices):
+
+    # faces can only be looked up by index after the lookup table is ready
+
+    bm.faces.ensure_lookup_table()
+
+    bmesh.ops.delete(bm, geom=[bm.faces[i] for i in indices], context="FACES")
+
+
+def keep_material(mesh, material):
+
+    # Blender leaves an object separated by material with only one material slot
+    # clearing the materials also resets the material index of every face
+
+    mesh.materials.clear()
+    mesh.materials.append(material)
+
+
+def link_piece(obj, mesh):
+
+    # copy the object so that modifiers and properties come along with it
+    # the copy uses the given mesh
+
+    piece = obj.copy()
+    piece.data = mesh
+
+    for collection in obj.users_collection:
+        collection.objects.link(piece)
+
+    return piece
+
+
+def new_piece(obj, template, bm):
+
+    # the geometry itself comes from the given bmesh
+
+    mesh = template.copy()
+    bm.to_mesh(mesh)
+
+    return link_piece(obj, mesh)
+
+
+def link_pieces(obj, pieces):
+
+    # objects that share a mesh with an object that was already separated
+    # get pieces of their own that share the meshes of the pieces of that object
+
+    copies = [ link_piece(obj, piece.data) for piece in pieces ]
+
+    roles.forget(obj)
+
+    return copies
+
+
+def separate(obj, apart):
+
+    # geometry that uses a material meant to be apart from everything else
+    # ends up in separate objects with one material slot each
+    # everything else ends up together in one new object
+    # this gives the same results as selecting by material and using the operators
+
+    # if there are less than two materials
+    # there is no need to do anything here
+
+    if len(obj.material_slots) < 2: return []
+
+    mesh = obj.data
+    groups = group_faces(obj, apart)
+
+    keys = split_order(groups)
+    rest = numpy.flatnonzero(groups < 0)
+
+    # if all the geometry would end up in a single object
+    # there is nothing that needs to be separated
+
+    if not splits(keys, len(rest)): return []
+
+    # read the geometry of the object once
+    # each piece is copied from only its own faces
+
+    source = bmesh.new()
+    source.from_mesh(mesh)
+    source.faces.ensure_lookup_table()
+
+    faces = buckets(groups)
+
+    # the template keeps the materials and settings of the mesh without its geometry
+
+    template = mesh.copy()
+    template.clear_geometry()
+
+    pieces = []
+
+    # separate everything that should stay together first
+
+    if len(rest):
+
+        bm = copy_faces(source, [ source.faces[i] for i in faces[-1].tolist() ])
+
+        pieces.append(new_piece(obj, template, bm))
+        bm.free()
+
+    # separate everything else by material
+    # the geometry of the last material is left in the original object
+
+    for key in keys[:-1]:
+
+        bm = copy_faces(source, [ source.faces[i] for i in faces[key].tolist() ])
+
+        piece = new_piece(obj, template, bm)
+        keep_material(piece.data, obj.material_slots[key].material)
+
+        pieces.append(piece)
+        bm.free()
+
+    # trim the original object down to the last material in one go
+    # vertices that were loose in the original mesh stay there
+
+    key = keys[-1]
+    material = obj.material_slots[key].material
+
+    delete_faces(source, numpy.flatnonzero(groups != key))
+    source.to_mesh(mesh)
+    source.free()
+
+    keep_material(mesh, material)
+
+    bpy.data.meshes.remove(template)
+
+    # the material slots of the original object have changed
+
+    roles.forget(obj)
+
+    return pieces
@@ -0,0 +1,277 @@
+import heapq
+import json
+import os
+
+import bpy
+
+from . import applier
+from . import fingerprints
+from . import orphans
+from . import planner
+
+
+# convert one huge level with several Blender processes at once
+# this runs inside Blender in the background and is started by the batch driver
+
+# the level is planned once and its objects are split into shards with about as many faces each
+# every shard is converted from the original file by a process of its own
+# and the converted objects of every shard are appended into one file at the end
+
+# every shard carries out the same plan
+# so the materials and the asset type of the scene end up the same in every shard
+
+# the name each material had in the original file
+# copies appended from other shards are replaced with the material of the same name
+
+MATERIAL = "furnace_material"
+
+# the collections each converted object belongs to in its shard
+
+COLLECTIONS = "furnace_collections"
+
+
+def manifest_path(directory):
+    return os.path.join(directory, "manifest.json")
+
+
+def shard_path(directory, index):
+    return os.path.join(directory, "shard_%d.blend" % index)
+
+
+def load_manifest(path):
+
+    with open(path) as f:
+        return json.load(f)
+
+
+def units(plan):
+
+    # objects that share a mesh or are copies of each other have to be converted together
+    # each group is kept whole along with the number of faces it has
+
+    names = [ entry["name"] for entry in plan["objects"] ]
+    parent = { name: name for name in names }
+
+    def find(name):
+
+        while parent[name] != name:
+            parent[name] = parent[parent[name]]
+            name = parent[name]
+
+        return name
+
+    def join(a, b):
+        if a in parent and b in parent: parent[find(a)] = find(b)
+
+    meshes = {}
+
+    for entry in plan["objects"]:
+
+        obj = bpy.data.objects[entry["name"]]
+
+        if obj.data in meshes: join(obj.name, meshes[obj.data])
+        else: meshes[obj.data] = obj.name
+
+        if entry.get("duplicate_of"): join(obj.name, entry["duplicate_of"])
+
+    groups = {}
+
+    for name in names:
+        groups.setdefault(find(name), []).append(name)
+
+    result = []
+
+    for group in groups.values():
+
+        # a shared mesh is only changed once
+
+        meshes = set(bpy.data.objects[name].data for name in group)
+
+        result.append((sum(len(mesh.polygons) for mesh in meshes), group))
+
+    return result
+
+
+def partition(groups, count):
+
+    # the largest groups go first to the shard with the fewest faces so far
+
+    shards = [ (0, i, []) for i in range(count) ]
+
+    for faces, names in sorted(groups, key=lambda g: -g[0]):
+
+        total, index, objects = heapq.heappop(shards)
+        objects.extend(names)
+
+        heapq.heappush(shards, (total + faces, index, objects))
+
+    # shards that got nothing are left out
+
+    return [ { "faces": total, "objects": objects } for total, index, objects in sorted(shards, key=lambda s: s[1]) if objects ]
+
+
+def prepare(source, directory, count, budget=None, instances=False):
+
+    # plan the whole level once and split its objects into shards
+    # lightmap scales are picked for the whole level so every shard uses the same ones
+
+    bpy.ops.wm.open_mainfile(filepath=source)
+
+    plan = planner.plan(instances=instances, budget=budget)
+
+    path = os.path.join(directory, "plan.json")
+    planner.save(plan, path)
+
+    shards = partition(units(plan), count)
+
+    for index, shard in enumerate(shards):
+        shard["output"] = shard_path(directory, index)
+
+    manifest = { "source": source, "plan": path, "shards": shards }
+
+    with open(manifest_path(directory), "w") as f:
+        json.dump(manifest, f, indent=4)
+
+    return manifest
+
+
+def remove_objects(names):
+
+    # the objects of other shards and the meshes only they used
+
+    objects = [ bpy.data.objects[name] for name in names if name in bpy.data.objects ]
+    meshes = set(obj.data for obj in objects)
+
+    bpy.data.batch_remove(objects)
+    bpy.data.batch_remove([ mesh for mesh in meshes if mesh.users == 0 ])
+
+
+def convert(manifest, index):
+
+    # convert the objects of one shard and save them in a file of their own
+
+    shard = manifest["shards"][index]
+    plan = planner.load(manifest["plan"])
+
+    bpy.ops.wm.open_mainfile(filepath=manifest["source"])
+
+    for material in bpy.data.materials:
+        material[MATERIAL] = material.name
+
+    keep = set(shard["objects"])
+
+    remove_objects([ entry["name"] for entry in plan["objects"] if entry["name"] not in keep ])
+
+    # objects that were not part of the plan stay in every shard
+    # everything else in the file after the run was made from the objects of this shard
+
+    left = set(obj for obj in bpy.data.objects if obj.name not in keep)
+
+    applied = applier.apply(plan)
+
+    converted = [ obj for obj in bpy.data.objects if obj not in left ]
+
+    for obj in converted:
+        obj[COLLECTIONS] = [ c.name for c in obj.users_collection ]
+
+    bpy.ops.wm.save_as_mainfile(filepath=shard["output"], copy=True)
+
+    return {
+        "shard": index,
+        "output": shard["output"],
+        "objects": [ obj.name for obj in converted ],
+        "slots_removed": applied.slots_removed,
+        "slots_merged": applied.slots_merged,
+        "orphans": applied.orphans.report()
+    }
+
+
+def append(path, names, lookup, prints):
+
+    # bring the converted objects of another shard into the open file
+    # each object goes into the collections it was in before
+
+    existing = set(bpy.data.materials)
+
+    with bpy.data.libraries.load(path, link=False) as (data_from, data_to):
+        requested = [ name for name in data_from.objects if name in names ]
+        data_to.objects = list(requested)
+
+    scene = bpy.context.scene
+
+    for obj in data_to.objects:
+
+        if obj is None: continue
+
+        collections = [ bpy.data.collections.get(name) for name in obj.get(COLLECTIONS, []) ]
+        collections = [ c for c in collections if c is not None ] or [ scene.collection ]
+
+        for collection in collections:
+            collection.objects.link(obj)
+
+    # the materials that came along are copies of materials already in the file
+    # unless no shard merged so far used them
+
+    for material in set(bpy.data.materials) - existing:
+
+        tag = material.get(MATERIAL)
+        original = lookup.setdefault(tag, material) if tag else None
+
+        if original is not None and original != material: material.user_remap(original)
+
+    # an object made by another shard can have the name of an object already in the file
+    # Blender gives the appended object a new name
+    # its fingerprint includes the name so it is worked out again for the new one
+    # otherwise the next run would convert the object again
+
+    renamed = 0
+
+    for name, obj in zip(requested, data_to.objects):
+
+        if obj is None or obj.name == name: continue
+
+        renamed += 1
+
+        if fingerprints.stored(obj): fingerprints.store(obj, fingerprints.object_fingerprint(obj, prints))
+
+    return len(data_to.objects), renamed
+
+
+def merge(results, output, plan):
+
+    # start from the first shard since it already has everything else in the level
+    # and append the converted objects of the other shards
+
+    results = sorted(results, key=lambda r: r["shard"])
+
+    bpy.ops.wm.open_mainfile(filepath=results[0]["output"])
+
+    collector = orphans.Collector()
+
+    lookup = { material.get(MATERIAL): material for material in bpy.data.materials if MATERIAL in material }
+
+    prints = { name: entry.get("fingerprint", "") for name, entry in plan["materials"].items() }
+
+    appended = 0
+    renamed = 0
+
+    for result in results[1:]:
+
+        count, names = append(result["output"], set(result["objects"]), lookup, prints)
+
+        appended += count
+        renamed += names
+
+    collector.collect()
+
+    # the tags are only needed while merging
+
+    for material in bpy.data.materials:
+        if MATERIAL in material: del material[MATERIAL]
+
+    for obj in bpy.data.objects:
+        if COLLECTIONS in obj: del obj[COLLECTIONS]
+
+    bpy.ops.wm.save_as_mainfile(filepath=output, copy=True)
+
+    return { "appended": appended, "renamed": renamed, "orphans": collector.report() }
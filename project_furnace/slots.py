@@ -0,0 +1,110 @@
+import bpy
+import numpy
+
+from . import separation
+
+
+def linked_to_objects(meshes):
+
+    # find the objects with materials linked to the object for each of the meshes
+    # those material slots belong to the objects rather than to the mesh
+
+    linked = {}
+
+    for obj in bpy.data.objects:
+
+        if obj.data not in meshes: continue
+
+        if any(slot.link == "OBJECT" for slot in obj.material_slots):
+            linked.setdefault(obj.data, []).append(obj)
+
+    return linked
+
+
+def used_slots(mesh):
+
+    # count the faces that use each material slot
+    # faces with an index past the last slot use the last slot
+
+    count = len(mesh.materials)
+    indices = separation.material_indices(mesh)
+
+    indices = numpy.minimum(indices, count - 1)
+
+    return indices, numpy.bincount(indices, minlength=count) > 0
+
+
+def remove_slots(mesh, indices, used):
+
+    # keep the materials of the slots that are used
+    # and change the index of every face to the index of its slot afterwards
+
+    kept = [ mesh.materials[i] for i in numpy.flatnonzero(used).tolist() ]
+    remap = numpy.cumsum(used, dtype=numpy.int32) - 1
+
+    # clearing the materials resets the index of every face
+    # so the new indices are written after the materials are added again
+
+    mesh.materials.clear()
+
+    for material in kept:
+        mesh.materials.append(material)
+
+    mesh.polygons.foreach_set("material_index", remap[indices])
+
+
+def pop_slots(mesh, used, users):
+
+    # removing a slot shifts the materials of the mesh and the index of faces that use later slots
+    # the slots of the objects using the mesh are only cut off at the end
+    # so the materials linked to each object are remembered first
+    # and written back to the slots they moved to
+
+    kept = numpy.flatnonzero(used).tolist()
+
+    links = [
+        [ (slot.link, slot.material if slot.link == "OBJECT" else None) for slot in obj.material_slots ]
+        for obj in users
+    ]
+
+    for index in reversed(numpy.flatnonzero(~used).tolist()):
+        mesh.materials.pop(index=index)
+
+    for obj, old in zip(users, links):
+
+        for new, index in enumerate(kept):
+
+            link, material = old[index]
+            slot = obj.material_slots[new]
+
+            slot.link = link
+
+            if link == "OBJECT": slot.material = material
+
+
+def prune(meshes=None):
+
+    # remove the material slots that no faces use from all the given meshes at once
+    # every mesh in the file is checked if no meshes are given
+
+    if meshes is None: meshes = bpy.data.meshes
+
+    meshes = set(mesh for mesh in meshes if len(mesh.materials))
+    linked = linked_to_objects(meshes)
+
+    removed = 0
+
+    for mesh in meshes:
+
+        indices, used = used_slots(mesh)
+
+        if used.all(): continue
+
+        removed += int((~used).sum())
+
+        if mesh in linked: pop_slots(mesh, used, linked[mesh])
+        else: remove_slots(mesh, indices, used)
+
+    # materials left unused are removed along with the rest of the orphaned data
+
+    return removed
@@ -0,0 +1,155 @@
+import functools
+
+
+# special symbols placed before or after the name of a material
+# each symbol enables the flag of the material with the same position
+# the position of each symbol is also the bit used for it in a flag mask
+
+MATERIAL_SYMBOLS = (
+    ("%", "two_sided"),
+    ("#", "transparent_1_sided"),
+    ("?", "transparent_2_sided"),
+    ("!", "render_only"),
+    ("@", "collision_only"),
+    ("*", "sphere_collision_only"),
+    ("$", "fog_plane"),
+    ("^", "ladder"),
+    ("-", "breakable"),
+    ("&", "ai_deafening"),
+    ("=", "no_shadow"),
+    (".", "shadow_only"),
+    (";", "lightmap_only"),
+    (")", "precise"),
+    (">", "conveyor"),
+    ("<", "portal_1_way"),
+    ("|", "portal_door"),
+    ("~", "portal_vis_blocker"),
+    ("(", "dislike_photons"),
+    ("{", "ignored_by_lightmaps"),
+    ("}", "blocks_sound"),
+    ("[", "decal_offset"),
+    ("'", "water_surface"),
+    ("0", "slip_surface"),
+    ("]", "group_transparents_by_plane")
+)
+
+# special symbols placed before the name of an object
+# each symbol sets an object property to the given value
+
+# some of the symbols change the same property
+# if a name has more than one of those symbols
+# the symbol placed last in the name takes precedence
+
+OBJECT_SYMBOLS = (
+    ("!", ("poop_lighting_ui", "_connected_geometry_poop_lighting_per_pixel")),
+    ("?", ("poop_lighting_ui", "_connected_geometry_poop_lighting_per_vertex")),
+    ("-", ("poop_pathfinding_ui", "_connected_poop_instance_pathfinding_policy_none")),
+    ("+", ("poop_pathfinding_ui", "_connected_poop_instance_pathfinding_policy_static")),
+    ("*", ("poop_render_only_ui", True)),
+    ("&", ("poop_chops_portals_ui", True)),
+    ("^", ("poop_does_not_block_aoe_ui", True)),
+    ("<", ("poop_excluded_from_lightprobe_ui", True)),
+    ("|", ("decal_offset_ui", True))
+)
+
+
+def compile_symbols(symbols):
+
+    # the table translates each symbol straight to its bit
+
+    return { c: 1 << i for i, (c, value) in enumerate(symbols) }
+
+
+def symbol_mask(table, symbols):
+
+    # combine the bits of all the symbols that are in the table
+
+    mask = 0
+
+    for c in symbols:
+        mask |= table.get(c, 0)
+
+    return mask
+
+
+def prefix(name):
+
+    # special symbols should be placed before the actual name
+    # the symbols end at the first letter or number
+
+    for i, c in enumerate(name):
+        if c.isalnum(): return name[:i]
+
+    return name
+
+
+def suffix(name):
+
+    # special symbols can also be placed after the actual name
+    # the symbols start after the last letter or number
+
+    for i in range(len(name) - 1, -1, -1):
+        if name[i].isalnum(): return name[i + 1:]
+
+    return name
+
+
+MATERIAL_TABLE = compile_symbols(MATERIAL_SYMBOLS)
+OBJECT_TABLE = dict(OBJECT_SYMBOLS)
+
+
+# materials and objects share names over and over again in a level
+# each unique name only needs to be parsed once
+
+@functools.lru_cache(maxsize=None)
+def parse_material_name(name):
+    return symbol_mask(MATERIAL_TABLE, prefix(name) + suffix(name))
+
+
+@functools.lru_cache(maxsize=None)
+def parse_object_name(name):
+
+    # the order of the symbols matters for objects
+    # so the values are given in the order the symbols are in the name
+
+    return tuple(OBJECT_TABLE[c] for c in prefix(name) if c in OBJECT_TABLE)
+
+
+def values(symbols, mask):
+
+    # list the values of the symbols whose bits are set in the mask
+
+    return tuple(value for i, (c, value) in enumerate(symbols) if mask >> i & 1)
+
+
+# only a few combinations of symbols are used in a level
+
+@functools.lru_cache(maxsize=None)
+def material_flags(mask):
+    return values(MATERIAL_SYMBOLS, mask)
+
+
+# the roles a material can have according to its name
+# the same names are used for the roles of objects during a run
+
+PORTAL = "portal"
+SKY = "sky"
+SEAM_SEALER = "seam_sealer"
+TWO_SIDED = "two_sided"
+
+
+def material_roles(name, flags):
+
+    # special materials are known by how their names start
+    # a material with glass in its name that is two-sided or transparent and two-sided
+    # probably is glass or something similar
+
+    roles = []
+
+    if name.startswith("+portal"): roles.append(PORTAL)
+    if name.startswith("+sky"): roles.append(SKY)
+    if name.startswith("+seamsealer"): roles.append(SEAM_SEALER)
+
+    if "glass" in name and ("two_sided" in flags or "transparent_2_sided" in flags): roles.append(TWO_SIDED)
+
+    return roles
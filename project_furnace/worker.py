@@ -0,0 +1,351 @@
+import json
+import os
+import sys
+import time
+import traceback
+
+from multiprocessing.connection import Listener
+
+import bpy
+
+
+# this runs inside Blender in the background
+# it is started by the batch driver with a list of files to convert
+
+#   blender -b --python worker.py -- --output DIRECTORY FILE [FILE ...]
+
+# it can also keep running and wait for files sent by the client
+# that way Blender only needs to start up once for many files
+
+#   blender -b --python worker.py -- --serve PORT
+
+# a single huge level can also be converted in shards by several workers at once
+
+#   blender -b --python worker.py -- --prepare-shards COUNT --output DIRECTORY FILE
+#   blender -b --python worker.py -- --shard INDEX MANIFEST
+#   blender -b --python worker.py -- --merge-shards --output DIRECTORY MANIFEST
+
+
+def ensure_registered():
+
+    # the add-on might not be installed in the Blender being used
+    # register it from this copy of the code if that is the case
+
+    if hasattr(bpy.types, "FURNACE_OT_main"): return
+
+    from . import main
+    main.register()
+
+
+def profiled():
+    return os.environ.get("FURNACE_PROFILE", "") not in ("", "0")
+
+
+def instances():
+
+    # copies of the same mesh only share one if asked for
+
+    return os.environ.get("FURNACE_INSTANCES", "") not in ("", "0")
+
+
+def lightmap_budget():
+
+    # the budget is given in millions of texels
+
+    budget = float(os.environ.get("FURNACE_LIGHTMAP_BUDGET", "") or 0)
+
+    return budget * 1e6 if budget > 0 else None
+
+
+def count_objects():
+
+    counts = { "objects": len(bpy.data.objects), "meshes": 0, "faces": 0 }
+
+    for obj in bpy.data.objects:
+
+        if obj.type != "MESH": continue
+
+        counts["meshes"] += 1
+        counts["faces"] += len(obj.data.polygons)
+
+    return counts
+
+
+def convert(source, output, progress=None):
+
+    # open the file, run FURNACE on it and save the result in the output directory
+    # a summary of what happened is returned and written next to the result
+
+    from . import applier
+    from . import lightmap
+    from . import planner
+    from . import profiling
+
+    if progress is None: progress = lambda stage: None
+
+    name = os.path.splitext(os.path.basename(source))[0]
+
+    summary = {
+        "file": source,
+        "output": os.path.join(output, name + ".blend"),
+        "status": "failed",
+        "timings": {},
+        "before": {},
+        "after": {},
+        "errors": []
+    }
+
+    timings = summary["timings"]
+
+    try:
+
+        progress("open")
+
+        start = time.perf_counter()
+        bpy.ops.wm.open_mainfile(filepath=source)
+        timings["open"] = time.perf_counter() - start
+
+        summary["before"] = count_objects()
+
+        # the plan is kept next to the result
+        # plans of different runs can be compared to see what changed
+
+        # the phases are measured in more detail if profiling was asked for
+
+        with profiling.run(profiled()):
+
+            progress("plan")
+
+            start = time.perf_counter()
+            plan = planner.plan(instances=instances(), budget=lightmap_budget())
+            timings["plan"] = time.perf_counter() - start
+
+            planner.save(plan, os.path.join(output, name + ".plan.json"))
+
+            # the lightmap resolution scales picked for the budget
+
+            if plan["lightmap"]:
+                summary["lightmap"] = os.path.join(output, name + ".lightmap.json")
+                lightmap.save(plan["lightmap"], summary["lightmap"])
+
+            progress("apply")
+
+            start = time.perf_counter()
+            applied = applier.apply(plan, verify=True)
+            timings["apply"] = time.perf_counter() - start
+
+        # data left unused by the run was removed along the way
+
+        summary["orphans"] = applied.orphans.report()
+
+        # object properties that Foundry did not keep
+
+        summary["mismatches"] = applied.mismatches
+
+        if profiled():
+            summary["profile"] = os.path.join(output, name + ".profile.json")
+            profiling.save(profiling.last, summary["profile"])
+
+        summary["after"] = count_objects()
+
+        progress("save")
+
+        start = time.perf_counter()
+        bpy.ops.wm.save_as_mainfile(filepath=summary["output"], copy=True)
+        timings["save"] = time.perf_counter() - start
+
+        summary["status"] = "finished"
+
+    except Exception:
+
+        summary["errors"].append(traceback.format_exc())
+
+    with open(os.path.join(output, name + ".json"), "w") as f:
+        json.dump(summary, f, indent=4)
+
+    return summary
+
+
+def reset():
+
+    # start the next file from an empty scene
+    # factory settings would also turn off the add-ons that were just registered
+
+    bpy.ops.wm.read_homefile(use_empty=True)
+
+
+def handle(connection):
+
+    # convert the files sent by the client one after another
+    # progress is sent back while each file is converted
+
+    while True:
+
+        try: message = connection.recv()
+        except EOFError: return True
+
+        if message.get("command") == "stop":
+            connection.send({ "event": "stopped" })
+            return False
+
+        if message.get("command") != "convert":
+            connection.send({ "event": "error", "message": "unknown command" })
+            continue
+
+        source = message["source"]
+        output = message["output"]
+
+        os.makedirs(output, exist_ok=True)
+
+        send = lambda stage: connection.send({ "event": "progress", "file": source, "stage": stage })
+
+        summary = convert(source, output, send)
+        reset()
+
+        connection.send({ "event": "result", "summary": summary })
+
+
+def authkey():
+
+    # anything that knows the key can make the worker run code
+    # so a key that is not given is made up and printed instead of using a fixed one
+
+    key = os.environ.get("FURNACE_AUTHKEY", "")
+
+    if key: return key.encode()
+
+    from . import client
+
+    key = client.new_authkey()
+
+    print("FURNACE_AUTHKEY was not set, connect with FURNACE_AUTHKEY=%s" % key.decode(), flush=True)
+
+    return key
+
+
+def serve(port, authkey):
+
+    # only accept connections from this machine
+    # the port is chosen by the system if none is given
+
+    with Listener(("localhost", port), authkey=authkey) as listener:
+
+        # the client waits for this line to know where to connect
+
+        print("FURNACE worker listening on port %d" % listener.address[1], flush=True)
+
+        running = True
+
+        while running:
+
+            with listener.accept() as connection:
+                running = handle(connection)
+
+    return 0
+
+
+def convert_shards(step, value, files, output):
+
+    # each step leaves a file behind for the batch driver to find
+    # a step that crashed is known by the file missing
+
+    from . import planner
+    from . import shards
+
+    if step == "prepare":
+
+        os.makedirs(output, exist_ok=True)
+        shards.prepare(files[0], output, value, lightmap_budget(), instances())
+
+        return 0
+
+    manifest = shards.load_manifest(files[0])
+    directory = os.path.dirname(os.path.abspath(files[0]))
+
+    if step == "convert":
+
+        result = shards.convert(manifest, value)
+
+        with open(os.path.join(directory, "shard_%d.json" % value), "w") as f:
+            json.dump(result, f, indent=4)
+
+        return 0
+
+    results = []
+
+    for index in range(len(manifest["shards"])):
+        with open(os.path.join(directory, "shard_%d.json" % index)) as f:
+            results.append(json.load(f))
+
+    name = os.path.splitext(os.path.basename(manifest["source"]))[0]
+
+    os.makedirs(output, exist_ok=True)
+
+    result = shards.merge(results, os.path.join(output, name + ".blend"), planner.load(manifest["plan"]))
+
+    with open(os.path.join(directory, "merge.json"), "w") as f:
+        json.dump(result, f, indent=4)
+
+    return 0
+
+
+def arguments(argv):
+
+    # Blender keeps its own arguments before the separator
+
+    argv = argv[argv.index("--") + 1:] if "--" in argv else []
+
+    output = os.getcwd()
+    port = None
+    shard = None
+    files = []
+
+    while argv:
+
+        arg = argv.pop(0)
+
+        if arg in ("-o", "--output"): output = argv.pop(0)
+        elif arg == "--serve": port = int(argv.pop(0))
+        elif arg == "--prepare-shards": shard = ("prepare", int(argv.pop(0)))
+        elif arg == "--shard": shard = ("convert", int(argv.pop(0)))
+        elif arg == "--merge-shards": shard = ("merge", None)
+        else: files.append(arg)
+
+    return output, port, shard, files
+
+
+def main(argv):
+
+    output, port, shard, files = arguments(argv)
+
+    ensure_registered()
+
+    if port is not None:
+        return serve(port, authkey())
+
+    if shard is not None:
+        return convert_shards(shard[0], shard[1], files, output)
+
+    os.makedirs(output, exist_ok=True)
+
+    failed = 0
+
+    for source in files:
+
+        summary = convert(source, output)
+
+        if summary["status"] != "finished": failed += 1
+
+    return 1 if failed else 0
+
+
+if __name__ == "__main__":
+
+    # run as a script the module is not part of the package
+    # import it again through the package so that everything else can be found
+
+    sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+    from project_furnace import worker
+
+    sys.exit(worker.main(sys.argv))